@@ -1,8 +1,12 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+from flask_migrate import Migrate
 from dotenv import load_dotenv
 import os
 from models import db
+from services.slot_cache import slot_cache
+from services.message_log_writer import message_log_writer
+from services.webhook_dedup import webhook_dedup
 
 # Importar blueprints
 from routes.auth import auth_bp
@@ -10,12 +14,13 @@ from routes.patients import patients_bp
 from routes.availability import availability_bp
 from routes.appointments import appointments_bp
 from routes.automation import automation_bp
+from routes.webhooks import webhooks_bp
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True)
+CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor'])
 
 # Configuração do banco de dados
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///psiagenda.db')
@@ -25,6 +30,7 @@ app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-flask-key')
 
 # Inicializar o banco de dados
 db.init_app(app)
+migrate = Migrate(app, db)
 
 # Registrar blueprints
 app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -32,6 +38,12 @@ app.register_blueprint(patients_bp, url_prefix='/patients')
 app.register_blueprint(availability_bp, url_prefix='/availability')
 app.register_blueprint(appointments_bp, url_prefix='/appointments')
 app.register_blueprint(automation_bp, url_prefix='/automation')
+app.register_blueprint(webhooks_bp, url_prefix='/webhooks')
+
+@app.teardown_request
+def flush_message_logs(exception=None):
+    # Logs de mensagens enviadas durante a requisição não ficam no buffer
+    message_log_writer.flush()
 
 @app.route('/')
 def index():
@@ -45,7 +57,9 @@ def index():
 def health():
     return jsonify({
         'status': 'healthy',
-        'database': 'connected'
+        'database': 'connected',
+        'slot_cache': slot_cache.stats(),
+        'webhook_dedup': webhook_dedup.stats()
     })
 
 # Criar tabelas do banco de dados
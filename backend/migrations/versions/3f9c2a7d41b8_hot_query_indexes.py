@@ -0,0 +1,46 @@
+"""Índices compostos para as consultas mais frequentes
+
+As tabelas base são criadas por db.create_all() na inicialização da API,
+que já cria estes índices em bancos novos; por isso a migração só cria os
+índices que ainda não existem.
+
+Revision ID: 3f9c2a7d41b8
+Revises:
+Create Date: 2026-10-17 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b8'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_appointments_user_id_start_status', 'appointments', ['user_id', 'start_datetime', 'status']),
+    ('ix_appointments_patient_id_status_start', 'appointments', ['patient_id', 'status', 'start_datetime']),
+    ('ix_patients_user_id_whatsapp', 'patients', ['user_id', 'whatsapp']),
+    ('ix_patients_whatsapp', 'patients', ['whatsapp']),
+    ('ix_message_logs_user_id_timestamp', 'message_logs', ['user_id', 'timestamp']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,31 @@
+"""Índice para a seleção de lembretes de todos os profissionais
+
+Revision ID: 8d4e1b6f2c90
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-17 20:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e1b6f2c90'
+down_revision = '3f9c2a7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    if 'ix_appointments_status_start' not in _existing_indexes('appointments'):
+        op.create_index('ix_appointments_status_start', 'appointments', ['status', 'start_datetime'])
+
+
+def downgrade():
+    if 'ix_appointments_status_start' in _existing_indexes('appointments'):
+        op.drop_index('ix_appointments_status_start', table_name='appointments')
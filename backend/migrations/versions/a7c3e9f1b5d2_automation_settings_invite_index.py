@@ -0,0 +1,32 @@
+"""Índice de dia e hora do convite semanal nas configurações de automação
+
+Revision ID: a7c3e9f1b5d2
+Revises: e4b8a1c6d2f7
+Create Date: 2026-10-17 23:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b5d2'
+down_revision = 'e4b8a1c6d2f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Em bancos novos o índice já foi criado por db.create_all()
+    inspector = sa.inspect(op.get_bind())
+
+    if 'ix_automation_settings_invite_dow_hour' not in {index['name'] for index in inspector.get_indexes('automation_settings')}:
+        op.create_index(
+            'ix_automation_settings_invite_dow_hour',
+            'automation_settings',
+            ['weekly_invite_dow', 'weekly_invite_hour']
+        )
+
+
+def downgrade():
+    op.drop_index('ix_automation_settings_invite_dow_hour', table_name='automation_settings')
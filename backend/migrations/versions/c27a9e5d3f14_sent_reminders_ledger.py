@@ -0,0 +1,37 @@
+"""Registro de lembretes enviados (sent_reminders)
+
+Revision ID: c27a9e5d3f14
+Revises: 8d4e1b6f2c90
+Create Date: 2026-10-17 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27a9e5d3f14'
+down_revision = '8d4e1b6f2c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Em bancos novos a tabela já foi criada por db.create_all()
+    if sa.inspect(op.get_bind()).has_table('sent_reminders'):
+        return
+
+    op.create_table(
+        'sent_reminders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('appointment_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['appointment_id'], ['appointments.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('appointment_id', 'kind', name='uq_sent_reminders_appointment_kind')
+    )
+
+
+def downgrade():
+    op.drop_table('sent_reminders')
@@ -0,0 +1,32 @@
+"""ID da mensagem do WhatsApp (wamid) nos logs de mensagens
+
+Revision ID: e4b8a1c6d2f7
+Revises: c27a9e5d3f14
+Create Date: 2026-10-17 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8a1c6d2f7'
+down_revision = 'c27a9e5d3f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Em bancos novos a coluna e o índice já foram criados por db.create_all()
+    inspector = sa.inspect(op.get_bind())
+
+    if 'wamid' not in {column['name'] for column in inspector.get_columns('message_logs')}:
+        op.add_column('message_logs', sa.Column('wamid', sa.String(length=128), nullable=True))
+
+    if 'ix_message_logs_wamid' not in {index['name'] for index in inspector.get_indexes('message_logs')}:
+        op.create_index('ix_message_logs_wamid', 'message_logs', ['wamid'])
+
+
+def downgrade():
+    op.drop_index('ix_message_logs_wamid', table_name='message_logs')
+    op.drop_column('message_logs', 'wamid')
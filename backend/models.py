@@ -45,6 +45,10 @@ class Subscription(db.Model):
 
 class Patient(db.Model):
     __tablename__ = 'patients'
+    __table_args__ = (
+        db.Index('ix_patients_user_id_whatsapp', 'user_id', 'whatsapp'),
+        db.Index('ix_patients_whatsapp', 'whatsapp'),  # Busca do webhook pelo remetente
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -99,6 +103,11 @@ class Blackout(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_user_id_start_status', 'user_id', 'start_datetime', 'status'),
+        db.Index('ix_appointments_patient_id_status_start', 'patient_id', 'status', 'start_datetime'),
+        db.Index('ix_appointments_status_start', 'status', 'start_datetime'),  # Lembretes de todos os profissionais
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -110,8 +119,22 @@ class Appointment(db.Model):
     source = db.Column(db.String(20), default='manual')  # auto, manual
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class SentReminder(db.Model):
+    __tablename__ = 'sent_reminders'
+    __table_args__ = (
+        db.UniqueConstraint('appointment_id', 'kind', name='uq_sent_reminders_appointment_kind'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # d1, h3
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class AutomationSetting(db.Model):
     __tablename__ = 'automation_settings'
+    __table_args__ = (
+        db.Index('ix_automation_settings_invite_dow_hour', 'weekly_invite_dow', 'weekly_invite_hour'),  # Convites semanais devidos
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -140,13 +163,18 @@ class MessageTemplate(db.Model):
 
 class MessageLog(db.Model):
     __tablename__ = 'message_logs'
+    __table_args__ = (
+        db.Index('ix_message_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_message_logs_wamid', 'wamid'),  # Callbacks de status do webhook
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     type = db.Column(db.String(20), nullable=False)
     payload_json = db.Column(db.Text)
-    status = db.Column(db.String(20), default='sent')  # sent, delivered, failed, responded
+    status = db.Column(db.String(20), default='sent')  # sent, delivered, read, failed, responded
+    wamid = db.Column(db.String(128))  # ID da mensagem no WhatsApp (mensagens enviadas)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     @property
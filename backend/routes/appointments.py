@@ -1,19 +1,62 @@
 from flask import Blueprint, request, jsonify
-from models import Appointment, Patient, db
+from models import Appointment, Patient, SentReminder, db
 from routes.auth import token_required
+from services.slot_cache import slot_cache
+from scheduler import schedule_reminders
+from sqlalchemy import and_, or_
 from datetime import datetime, timedelta
+import base64
+import binascii
 import pytz
 
 appointments_bp = Blueprint('appointments', __name__)
 
+# Tamanho das páginas da listagem (paginação opcional, ativada por limit ou cursor)
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 500
+
 @appointments_bp.route('', methods=['GET'])
 @token_required
 def get_appointments(current_user):
+    """
+    Lista agendamentos ordenados por (start_datetime, id)
+
+    Parâmetros: from, to (YYYY-MM-DD), limit (1-500) e cursor. Sem limit e
+    sem cursor a lista vem completa, como antes da paginação. A paginação é
+    opcional: com limit (ou com cursor, usando 200 por página) vem uma
+    página, e quando há mais resultados o cursor da próxima página vem no
+    header X-Next-Cursor.
+    """
     # Parâmetros de filtro
     from_date = request.args.get('from')
     to_date = request.args.get('to')
+    cursor = request.args.get('cursor')
+    
+    limit = None
+    if 'limit' in request.args or cursor:
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'Parâmetro limit inválido (1-{MAX_PAGE_SIZE})'}), 400
     
-    query = Appointment.query.filter_by(user_id=current_user.id)
+    # Uma única consulta com o nome do paciente, apenas com as colunas serializadas
+    query = db.session.query(
+        Appointment.id,
+        Appointment.patient_id,
+        Patient.name.label('patient_name'),
+        Appointment.start_datetime,
+        Appointment.end_datetime,
+        Appointment.mode,
+        Appointment.status,
+        Appointment.source,
+        Appointment.created_at
+    ).outerjoin(
+        Patient, Patient.id == Appointment.patient_id
+    ).filter(
+        Appointment.user_id == current_user.id
+    )
     
     # Aplicar filtros de data se fornecidos
     if from_date:
@@ -31,35 +74,69 @@ def get_appointments(current_user):
         except ValueError:
             return jsonify({'error': 'Formato de data inválido para to (YYYY-MM-DD)'}), 400
     
-    # Executar a consulta
-    appointments = query.order_by(Appointment.start_datetime).all()
+    # Paginação por chave: continuar após o último (start_datetime, id) da página anterior
+    if cursor:
+        try:
+            cursor_start, cursor_id = _decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Cursor inválido'}), 400
+        
+        query = query.filter(or_(
+            Appointment.start_datetime > cursor_start,
+            and_(Appointment.start_datetime == cursor_start, Appointment.id > cursor_id)
+        ))
+    
+    # Executar a consulta (uma linha a mais indica que existe próxima página)
+    query = query.order_by(Appointment.start_datetime, Appointment.id)
+    has_more = False
+    if limit is None:
+        rows = query.all()
+    else:
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
     
     # Obter o timezone do usuário
     user_timezone = pytz.timezone(current_user.timezone)
     
     result = []
-    for appt in appointments:
+    for row in rows:
         # Converter horários para o timezone do usuário
-        start_local = pytz.utc.localize(appt.start_datetime).astimezone(user_timezone)
-        end_local = pytz.utc.localize(appt.end_datetime).astimezone(user_timezone)
-        
-        # Obter informações do paciente
-        patient = Patient.query.get(appt.patient_id)
-        patient_name = patient.name if patient else "Paciente não encontrado"
+        start_local = pytz.utc.localize(row.start_datetime).astimezone(user_timezone)
+        end_local = pytz.utc.localize(row.end_datetime).astimezone(user_timezone)
         
         result.append({
-            'id': appt.id,
-            'patient_id': appt.patient_id,
-            'patient_name': patient_name,
+            'id': row.id,
+            'patient_id': row.patient_id,
+            'patient_name': row.patient_name or "Paciente não encontrado",
             'start_datetime': start_local.isoformat(),
             'end_datetime': end_local.isoformat(),
-            'mode': appt.mode,
-            'status': appt.status,
-            'source': appt.source,
-            'created_at': appt.created_at.isoformat()
+            'mode': row.mode,
+            'status': row.status,
+            'source': row.source,
+            'created_at': row.created_at.isoformat()
         })
     
-    return jsonify(result), 200
+    response = jsonify(result)
+    
+    if has_more:
+        response.headers['X-Next-Cursor'] = _encode_cursor(rows[-1].start_datetime, rows[-1].id)
+    
+    return response, 200
+
+def _encode_cursor(start_datetime, appointment_id):
+    """Codifica a posição (start_datetime, id) como cursor opaco"""
+    raw = f'{start_datetime.isoformat()}|{appointment_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decodifica o cursor; levanta ValueError se for inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start, appointment_id = raw.split('|')
+        return datetime.fromisoformat(start), int(appointment_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError('Cursor inválido') from e
 
 @appointments_bp.route('', methods=['POST'])
 @token_required
@@ -117,6 +194,8 @@ def create_appointment(current_user):
     
     try:
         db.session.commit()
+        slot_cache.invalidate(current_user.id, [new_appointment.start_datetime, new_appointment.end_datetime])
+        schedule_reminders(new_appointment)
         
         # Converter de volta para o timezone do usuário para a resposta
         start_local = pytz.utc.localize(new_appointment.start_datetime).astimezone(user_timezone)
@@ -151,6 +230,9 @@ def update_appointment(current_user, appointment_id):
     
     data = request.get_json()
     
+    # Semanas ocupadas antes da alteração (para invalidar o cache de slots)
+    previous_days = [appointment.start_datetime, appointment.end_datetime]
+    
     # Atualizar status
     if data.get('status') in ['scheduled', 'confirmed', 'cancelled', 'no_show', 'completed']:
         appointment.status = data['status']
@@ -182,6 +264,9 @@ def update_appointment(current_user, appointment_id):
             appointment.start_datetime = new_start_utc
             appointment.end_datetime = new_end_utc
             
+            # Novo horário: os lembretes D-1/H-3 devem ser enviados novamente
+            SentReminder.query.filter_by(appointment_id=appointment.id).delete()
+            
         except (ValueError, pytz.exceptions.UnknownTimeZoneError):
             return jsonify({'error': 'Formato de data/hora inválido'}), 400
     
@@ -191,6 +276,11 @@ def update_appointment(current_user, appointment_id):
     
     try:
         db.session.commit()
+        slot_cache.invalidate(
+            current_user.id,
+            previous_days + [appointment.start_datetime, appointment.end_datetime]
+        )
+        schedule_reminders(appointment)
         
         # Converter para o timezone do usuário para a resposta
         user_timezone = pytz.timezone(current_user.timezone)
@@ -1,11 +1,63 @@
 from flask import Blueprint, request, jsonify, current_app
+import os
+import time
 import jwt
+from collections import namedtuple
 from datetime import datetime, timedelta
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import User, db
+from services.cache import LRUCache
 
 auth_bp = Blueprint('auth', __name__)
 
+# Campos do usuário usados pelas rotas protegidas (passado como current_user)
+AuthenticatedUser = namedtuple('AuthenticatedUser', ['id', 'name', 'timezone', 'plan'])
+
+# Caches por processo: usuários autenticados e tokens já verificados (até expirarem)
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+_user_cache = LRUCache(maxsize=int(os.getenv('AUTH_CACHE_SIZE', 4096)), ttl=AUTH_CACHE_TTL)
+_token_cache = LRUCache(maxsize=int(os.getenv('AUTH_CACHE_SIZE', 4096)))
+
+def invalidate_user(user_id):
+    """Remove o usuário do cache de autenticação deste processo"""
+    _user_cache.delete(user_id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_on_change(mapper, connection, target):
+    invalidate_user(target.id)
+
+def _decode_token(token):
+    """Verifica o token e retorna o user_id, memorizando o resultado até a expiração"""
+    user_id = _token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    
+    data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    
+    ttl = data['exp'] - time.time() if 'exp' in data else AUTH_CACHE_TTL
+    if ttl > 0:
+        _token_cache.set(token, data['user_id'], ttl=ttl)
+    
+    return data['user_id']
+
+def _load_user(user_id):
+    """Retorna o AuthenticatedUser (do cache ou do banco) ou None"""
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    row = db.session.query(User.id, User.name, User.timezone, User.plan).filter(User.id == user_id).first()
+    if not row:
+        return None
+    
+    user = AuthenticatedUser(*row)
+    if AUTH_CACHE_TTL > 0:
+        _user_cache.set(user_id, user)
+    
+    return user
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -110,9 +162,8 @@ def token_required(f):
             return jsonify({'error': 'Token não fornecido'}), 401
         
         try:
-            # Decodificar o token
-            data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
+            # Decodificar o token e obter o usuário (com cache por processo)
+            current_user = _load_user(_decode_token(token))
             
             if not current_user:
                 return jsonify({'error': 'Usuário não encontrado'}), 401
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from models import AutomationSetting, MessageTemplate, db
 from routes.auth import token_required
+from scheduler import schedule_weekly_invite
+from services.templates import PLACEHOLDERS, UnknownPlaceholderError, validate_template
 
 automation_bp = Blueprint('automation', __name__)
 
@@ -22,6 +24,7 @@ def get_automation_settings(current_user):
         )
         db.session.add(settings)
         db.session.commit()
+        schedule_weekly_invite(settings, current_user.timezone)
     
     return jsonify({
         'mode': settings.mode,
@@ -69,6 +72,8 @@ def update_automation_settings(current_user):
     
     try:
         db.session.commit()
+        schedule_weekly_invite(settings, current_user.timezone)
+        
         return jsonify({
             'mode': settings.mode,
             'weekly_invite_dow': settings.weekly_invite_dow,
@@ -124,9 +129,9 @@ def get_message_templates(current_user):
         if template_type not in existing_types:
             new_template = MessageTemplate(
                 user_id=current_user.id,
-                type=template_type,
-                content_json=default_templates[template_type]
+                type=template_type
             )
+            new_template.content = default_templates[template_type]
             db.session.add(new_template)
             templates.append(new_template)
     
@@ -138,7 +143,7 @@ def get_message_templates(current_user):
         result.append({
             'id': template.id,
             'type': template.type,
-            'content': template.content_json
+            'content': template.content
         })
     
     return jsonify(result), 200
@@ -158,8 +163,7 @@ def update_message_template(current_user, template_type):
         # Criar template se não existir
         template = MessageTemplate(
             user_id=current_user.id,
-            type=template_type,
-            content_json={}
+            type=template_type
         )
         db.session.add(template)
     
@@ -168,8 +172,17 @@ def update_message_template(current_user, template_type):
     if not data or not data.get('content'):
         return jsonify({'error': 'Conteúdo é obrigatório'}), 400
     
+    # Rejeitar placeholders que o envio não sabe preencher
+    try:
+        validate_template(data['content'])
+    except UnknownPlaceholderError as e:
+        return jsonify({
+            'error': str(e),
+            'allowed_placeholders': sorted(PLACEHOLDERS)
+        }), 400
+    
     # Atualizar conteúdo do template
-    template.content_json = {
+    template.content = {
         'content': data['content'],
         'buttons': data.get('buttons', [])
     }
@@ -179,7 +192,7 @@ def update_message_template(current_user, template_type):
         return jsonify({
             'id': template.id,
             'type': template.type,
-            'content': template.content_json
+            'content': template.content
         }), 200
     
     except Exception as e:
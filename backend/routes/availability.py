@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from models import Availability, Blackout, Appointment, db
+from models import Availability, Blackout, db
 from routes.auth import token_required
+from services.slots import format_slots
+from services.slot_cache import slot_cache, cached_free_slots
 from datetime import datetime, timedelta
 import pytz
 
@@ -67,6 +69,10 @@ def create_availability(current_user):
     
     try:
         db.session.commit()
+        
+        # Disponibilidade é semanal: todas as semanas do profissional mudam
+        slot_cache.invalidate(current_user.id)
+        
         return jsonify({
             'id': new_availability.id,
             'weekday': new_availability.weekday,
@@ -95,6 +101,7 @@ def delete_availability(current_user, availability_id):
     try:
         db.session.delete(availability)
         db.session.commit()
+        slot_cache.invalidate(current_user.id)
         return jsonify({'message': 'Disponibilidade removida com sucesso'}), 200
     
     except Exception as e:
@@ -140,6 +147,8 @@ def create_blackout(current_user):
     
     try:
         db.session.commit()
+        slot_cache.invalidate(current_user.id, [new_blackout.date])
+        
         return jsonify({
             'id': new_blackout.id,
             'date': new_blackout.date.strftime('%Y-%m-%d'),
@@ -151,125 +160,67 @@ def create_blackout(current_user):
         return jsonify({'error': f'Erro ao criar bloqueio: {str(e)}'}), 500
 
 # Rota para gerar slots disponíveis com base na disponibilidade, agendamentos e bloqueios
+#
+# Modos de consulta:
+#   ?week=YYYY-WW                  semana completa
+#   ?from=YYYY-MM-DD&weeks=N       intervalo de N semanas (padrão 4, máximo 12)
+#   ?limit=N                       apenas os N primeiros slots livres; sem week/from, a partir de agora
 @availability_bp.route('/slots', methods=['GET'])
 @token_required
 def get_slots(current_user):
-    # Obter a semana solicitada (formato YYYY-WW)
     week_param = request.args.get('week')
-    if not week_param:
-        return jsonify({'error': 'Parâmetro week é obrigatório (formato YYYY-WW)'}), 400
-    
-    try:
-        year, week = map(int, week_param.split('-'))
-        # Calcular a data do primeiro dia da semana (segunda-feira)
-        first_day = datetime.strptime(f'{year}-{week}-1', '%Y-%W-%w').date()
-    except ValueError:
-        return jsonify({'error': 'Formato de semana inválido (YYYY-WW)'}), 400
+    from_param = request.args.get('from')
+    limit_param = request.args.get('limit')
+    
+    if not week_param and not from_param and not limit_param:
+        return jsonify({'error': 'Informe week (YYYY-WW), from (YYYY-MM-DD) ou limit'}), 400
+    
+    limit = None
+    if limit_param:
+        try:
+            limit = int(limit_param)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= 100:
+            return jsonify({'error': 'Parâmetro limit inválido (1-100)'}), 400
+    
+    not_before = None
+    
+    if week_param:
+        # Semana solicitada (formato YYYY-WW)
+        try:
+            year, week = map(int, week_param.split('-'))
+            # Calcular a data do primeiro dia da semana (segunda-feira)
+            first_day = datetime.strptime(f'{year}-{week}-1', '%Y-%W-%w').date()
+        except ValueError:
+            return jsonify({'error': 'Formato de semana inválido (YYYY-WW)'}), 400
+        
+        # Calcular o último dia da semana (domingo)
+        last_day = first_day + timedelta(days=6)
+    else:
+        try:
+            weeks = int(request.args.get('weeks', 4))
+        except ValueError:
+            weeks = 0
+        if not 1 <= weeks <= 12:
+            return jsonify({'error': 'Parâmetro weeks inválido (1-12)'}), 400
+        
+        if from_param:
+            try:
+                first_day = datetime.strptime(from_param, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'Formato de data inválido para from (YYYY-MM-DD)'}), 400
+        else:
+            # Próximos slots a partir de agora
+            not_before = datetime.utcnow()
+            first_day = not_before.date()
+        
+        last_day = first_day + timedelta(weeks=weeks) - timedelta(days=1)
     
     # Obter o timezone do usuário
     user_timezone = pytz.timezone(current_user.timezone)
     
-    # Calcular o último dia da semana (domingo)
-    last_day = first_day + timedelta(days=6)
-    
-    # Obter a disponibilidade do usuário
-    availability = Availability.query.filter_by(
-        user_id=current_user.id,
-        active=True
-    ).all()
-    
-    # Obter os bloqueios do usuário para a semana
-    blackouts = Blackout.query.filter_by(
-        user_id=current_user.id
-    ).filter(
-        Blackout.date >= first_day,
-        Blackout.date <= last_day
-    ).all()
-    
-    # Obter os agendamentos do usuário para a semana
-    appointments = Appointment.query.filter_by(
-        user_id=current_user.id
-    ).filter(
-        Appointment.start_datetime >= datetime.combine(first_day, datetime.min.time()),
-        Appointment.start_datetime <= datetime.combine(last_day, datetime.max.time())
-    ).filter(
-        Appointment.status.in_(['scheduled', 'confirmed'])
-    ).all()
-    
-    # Converter bloqueios para um conjunto de datas para verificação rápida
-    blackout_dates = {b.date for b in blackouts}
-    
-    # Converter agendamentos para um dicionário de slots ocupados
-    booked_slots = {}
-    for appt in appointments:
-        day = appt.start_datetime.date()
-        if day not in booked_slots:
-            booked_slots[day] = []
-        
-        booked_slots[day].append({
-            'start': appt.start_datetime,
-            'end': appt.end_datetime
-        })
-    
-    # Gerar slots disponíveis
-    available_slots = []
-    
-    # Para cada dia da semana
-    current_date = first_day
-    while current_date <= last_day:
-        # Verificar se o dia está bloqueado
-        if current_date in blackout_dates:
-            current_date += timedelta(days=1)
-            continue
-        
-        # Obter o dia da semana (0-6, onde 0 é segunda-feira)
-        weekday = current_date.weekday()
-        
-        # Encontrar disponibilidade para este dia da semana
-        day_availability = [a for a in availability if a.weekday == weekday]
-        
-        # Para cada período de disponibilidade neste dia
-        for avail in day_availability:
-            # Calcular slots com base na duração da sessão e intervalo
-            slot_duration = timedelta(minutes=avail.duration_min)
-            break_duration = timedelta(minutes=avail.break_min)
-            
-            # Horário de início e fim em datetime
-            start_dt = datetime.combine(current_date, avail.start_time)
-            end_dt = datetime.combine(current_date, avail.end_time)
-            
-            # Gerar slots
-            current_slot_start = start_dt
-            while current_slot_start + slot_duration <= end_dt:
-                current_slot_end = current_slot_start + slot_duration
-                
-                # Verificar se o slot está livre (não conflita com agendamentos)
-                is_available = True
-                if current_date in booked_slots:
-                    for booked in booked_slots[current_date]:
-                        # Verificar sobreposição
-                        if (current_slot_start < booked['end'] and 
-                            current_slot_end > booked['start']):
-                            is_available = False
-                            break
-                
-                # Se o slot estiver disponível, adicionar à lista
-                if is_available:
-                    # Converter para o timezone do usuário para exibição
-                    slot_start_local = pytz.utc.localize(current_slot_start).astimezone(user_timezone)
-                    slot_end_local = pytz.utc.localize(current_slot_end).astimezone(user_timezone)
-                    
-                    available_slots.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
-                        'start': slot_start_local.strftime('%H:%M'),
-                        'end': slot_end_local.strftime('%H:%M'),
-                        'duration': avail.duration_min
-                    })
-                
-                # Avançar para o próximo slot
-                current_slot_start = current_slot_end + break_duration
-        
-        # Avançar para o próximo dia
-        current_date += timedelta(days=1)
+    # Gerar slots disponíveis a partir do cache semanal (interrompido ao atingir o limite)
+    free_slots = cached_free_slots(current_user.id, first_day, last_day, not_before=not_before, limit=limit)
     
-    return jsonify(available_slots), 200
\ No newline at end of file
+    return jsonify(format_slots(free_slots, user_timezone)), 200
\ No newline at end of file
@@ -1,8 +1,10 @@
+import io
 from flask import Blueprint, request, jsonify
 from models import Patient, Consent, db
 from routes.auth import token_required
-import csv
-import io
+from services.patient_import import (
+    ASYNC_THRESHOLD_BYTES, MAX_FILE_BYTES, import_rows, iter_csv_rows, enqueue_import, get_import_status
+)
 from datetime import datetime
 
 patients_bp = Blueprint('patients', __name__)
@@ -139,55 +141,47 @@ def import_patients(current_user):
     if not file.filename.endswith('.csv'):
         return jsonify({'error': 'Formato inválido. Envie um arquivo CSV'}), 400
     
-    # Processar o arquivo CSV
-    stream = io.StringIO(file.stream.read().decode("utf-8"), newline=None)
-    csv_reader = csv.reader(stream, delimiter=';')
+    # O tamanho é medido pelos bytes lidos (uploads chunked não têm Content-Length)
+    head = file.stream.read(ASYNC_THRESHOLD_BYTES + 1)
     
-    imported = 0
-    errors = 0
-    
-    for row in csv_reader:
-        if len(row) < 2:
-            errors += 1
-            continue
-        
-        name = row[0].strip()
-        whatsapp = ''.join(filter(str.isdigit, row[1]))
-        
-        if not name or not whatsapp:
-            errors += 1
-            continue
-        
-        # Verificar se o paciente já existe
-        existing = Patient.query.filter_by(
-            user_id=current_user.id, 
-            whatsapp=whatsapp
-        ).first()
-        
-        if existing:
-            errors += 1
-            continue
-        
-        new_patient = Patient(
-            user_id=current_user.id,
-            name=name,
-            whatsapp=whatsapp,
-            status='active',
-            preferences_json={},
-            created_at=datetime.utcnow()
-        )
+    # Arquivos grandes são importados em background para não bloquear o worker HTTP
+    if len(head) > ASYNC_THRESHOLD_BYTES:
+        content = head + file.stream.read(MAX_FILE_BYTES - len(head) + 1)
+        if len(content) > MAX_FILE_BYTES:
+            return jsonify({'error': 'Arquivo muito grande para importação'}), 413
         
-        db.session.add(new_patient)
-        imported += 1
+        import_id = enqueue_import(current_user.id, content)
+        return jsonify({
+            'message': 'Importação agendada',
+            'import_id': import_id,
+            'status': 'queued'
+        }), 202
     
+    # Processar o arquivo CSV em lotes, com um único commit no final
     try:
+        result = import_rows(current_user.id, iter_csv_rows(io.BytesIO(head)))
         db.session.commit()
         return jsonify({
-            'message': f'Importação concluída: {imported} pacientes importados, {errors} erros',
-            'imported': imported,
-            'errors': errors
+            'message': f"Importação concluída: {result['imported']} pacientes importados, {result['errors']} erros",
+            'imported': result['imported'],
+            'errors': result['errors']
         }), 200
     
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'error': 'Arquivo CSV deve estar em UTF-8'}), 400
+    
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'Erro na importação: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Erro na importação: {str(e)}'}), 500
+
+@patients_bp.route('/import/<import_id>', methods=['GET'])
+@token_required
+def get_import_status_route(current_user, import_id):
+    status = get_import_status(import_id)
+    
+    if not status or status['user_id'] != current_user.id:
+        return jsonify({'error': 'Importação não encontrada'}), 404
+    
+    status.pop('user_id')
+    return jsonify(status), 200
\ No newline at end of file
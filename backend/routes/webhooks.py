@@ -1,166 +1,38 @@
 from flask import Blueprint, request, jsonify
-from models import Patient, Appointment, MessageLog, db
+from services.webhook_processor import is_valid_payload, enqueue_webhook, process_batch
 from datetime import datetime
 import json
+import redis
 
 webhooks_bp = Blueprint('webhooks', __name__)
 
 @webhooks_bp.route('/whatsapp', methods=['POST'])
 def whatsapp_webhook():
-    """Webhook para receber mensagens e interações do WhatsApp"""
-    data = request.get_json()
+    """
+    Webhook para receber mensagens e interações do WhatsApp
+    
+    Apenas valida o payload e grava o corpo bruto na fila do Redis; o
+    processamento (pacientes, agendamentos, logs) é feito em lotes pelo job
+    process_webhook_events, para responder à Meta em milissegundos.
+    """
+    raw_body = request.get_data()
+    data = request.get_json(silent=True)
     
     # Verificar se é uma mensagem válida
-    if not data or 'entry' not in data:
+    if not is_valid_payload(data):
         return jsonify({'status': 'error', 'message': 'Payload inválido'}), 400
     
     try:
-        # Processar cada entrada
-        for entry in data['entry']:
-            for change in entry.get('changes', []):
-                value = change.get('value', {})
-                
-                # Verificar se é uma mensagem
-                if 'messages' not in value:
-                    continue
-                
-                for message in value['messages']:
-                    # Obter número do remetente
-                    sender = message.get('from')
-                    if not sender:
-                        continue
-                    
-                    # Encontrar o paciente pelo número de WhatsApp
-                    patient = Patient.query.filter_by(whatsapp=sender).first()
-                    if not patient:
-                        continue
-                    
-                    # Processar mensagem de texto
-                    if message.get('type') == 'text':
-                        text = message.get('text', {}).get('body', '').lower()
-                        
-                        # Verificar se é um opt-out ("parar")
-                        if text == 'parar':
-                            patient.status = 'optout'
-                            db.session.commit()
-                            
-                            # Registrar log
-                            log = MessageLog(
-                                user_id=patient.user_id,
-                                patient_id=patient.id,
-                                type='optout',
-                                payload_json={'text': text},
-                                status='responded',
-                                timestamp=datetime.utcnow()
-                            )
-                            db.session.add(log)
-                            db.session.commit()
-                    
-                    # Processar interações com botões
-                    elif message.get('type') == 'interactive':
-                        interactive = message.get('interactive', {})
-                        
-                        if interactive.get('type') == 'button_reply':
-                            button_reply = interactive.get('button_reply', {})
-                            button_id = button_reply.get('id')
-                            button_text = button_reply.get('title')
-                            
-                            # Processar resposta com base no botão
-                            if button_text == 'Confirmar':
-                                # Buscar próximo agendamento do paciente
-                                appointment = Appointment.query.filter_by(
-                                    patient_id=patient.id,
-                                    status='scheduled'
-                                ).order_by(Appointment.start_datetime).first()
-                                
-                                if appointment:
-                                    appointment.status = 'confirmed'
-                                    db.session.commit()
-                                    
-                                    # Registrar log
-                                    log = MessageLog(
-                                        user_id=patient.user_id,
-                                        patient_id=patient.id,
-                                        type='confirmation',
-                                        payload_json={'button': button_text},
-                                        status='responded',
-                                        timestamp=datetime.utcnow()
-                                    )
-                                    db.session.add(log)
-                                    db.session.commit()
-                            
-                            elif button_text == 'Remarcar':
-                                # Buscar próximo agendamento do paciente
-                                appointment = Appointment.query.filter_by(
-                                    patient_id=patient.id
-                                ).filter(
-                                    Appointment.status.in_(['scheduled', 'confirmed'])
-                                ).order_by(Appointment.start_datetime).first()
-                                
-                                if appointment:
-                                    # Marcar para reagendamento (será processado pelo worker)
-                                    log = MessageLog(
-                                        user_id=patient.user_id,
-                                        patient_id=patient.id,
-                                        type='reschedule_request',
-                                        payload_json={
-                                            'button': button_text,
-                                            'appointment_id': appointment.id
-                                        },
-                                        status='responded',
-                                        timestamp=datetime.utcnow()
-                                    )
-                                    db.session.add(log)
-                                    db.session.commit()
-                            
-                            elif button_text == 'Pausar':
-                                # Pausar notificações para o paciente
-                                patient.status = 'paused'
-                                db.session.commit()
-                                
-                                # Registrar log
-                                log = MessageLog(
-                                    user_id=patient.user_id,
-                                    patient_id=patient.id,
-                                    type='pause',
-                                    payload_json={'button': button_text},
-                                    status='responded',
-                                    timestamp=datetime.utcnow()
-                                )
-                                db.session.add(log)
-                                db.session.commit()
-                            
-                            elif button_text == 'Cancelar':
-                                # Buscar próximo agendamento do paciente
-                                appointment = Appointment.query.filter_by(
-                                    patient_id=patient.id
-                                ).filter(
-                                    Appointment.status.in_(['scheduled', 'confirmed'])
-                                ).order_by(Appointment.start_datetime).first()
-                                
-                                if appointment:
-                                    appointment.status = 'cancelled'
-                                    db.session.commit()
-                                    
-                                    # Registrar log
-                                    log = MessageLog(
-                                        user_id=patient.user_id,
-                                        patient_id=patient.id,
-                                        type='cancellation',
-                                        payload_json={
-                                            'button': button_text,
-                                            'appointment_id': appointment.id
-                                        },
-                                        status='responded',
-                                        timestamp=datetime.utcnow()
-                                    )
-                                    db.session.add(log)
-                                    db.session.commit()
-        
-        return jsonify({'status': 'success'}), 200
+        enqueue_webhook(raw_body)
+    except redis.exceptions.RedisError as e:
+        # Corpo não gravado: processar na própria requisição; se falhar, a
+        # Meta recebe 500 e reenvia o evento
+        print(f"Fila de webhooks indisponível, processando na requisição: {str(e)}")
+        _, failed = process_batch([raw_body])
+        if failed:
+            return jsonify({'status': 'error', 'message': 'Erro ao processar webhook'}), 500
     
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({'status': 'success'}), 200
 
 @webhooks_bp.route('/billing', methods=['POST'])
 def billing_webhook():
@@ -0,0 +1,179 @@
+import sys
+import math
+import time
+import calendar
+from datetime import datetime, timedelta
+import pytz
+import redis
+from workers import conn, high_queue, default_queue, REMINDER_WINDOWS
+
+# Conjunto ordenado (membro -> timestamp UTC de vencimento)
+SCHEDULE_KEY = 'schedule:due'
+
+# Lista usada para acordar o scheduler quando um item novo é agendado
+WAKEUP_KEY = 'schedule:wakeup'
+
+# Tempo máximo de espera sem itens a vencer (segundos)
+MAX_IDLE_SECONDS = 60
+
+# Itens retirados por iteração
+POP_BATCH_SIZE = 500
+
+# Retira atomicamente os itens vencidos, para que só um scheduler os enfileire
+_POP_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+def _timestamp(dt_utc):
+    return calendar.timegm(dt_utc.timetuple())
+
+
+def _schedule(members):
+    """Grava {membro: vencimento} e acorda o scheduler; falhas de Redis não interrompem a API"""
+    try:
+        pipe = conn.pipeline()
+        pipe.zadd(SCHEDULE_KEY, members)
+        pipe.lpush(WAKEUP_KEY, 1)
+        pipe.ltrim(WAKEUP_KEY, 0, 0)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao agendar {list(members)}: {str(e)}")
+
+
+def _unschedule(members):
+    try:
+        conn.zrem(SCHEDULE_KEY, *members)
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao remover agendamento {members}: {str(e)}")
+
+
+def schedule_reminders(appointment):
+    """
+    Agenda os lembretes D-1 e H-3 de um agendamento (ou os remove se cancelado)
+
+    O vencimento é o meio da janela de envio (24h e 3h antes da sessão);
+    se a janela já começou, o lembrete vence imediatamente, e se já
+    terminou não é agendado. O job confere status e configurações na hora
+    do envio.
+    """
+    members = [f'reminder:{appointment.id}:{kind}' for kind in REMINDER_WINDOWS]
+
+    if appointment.status not in ('scheduled', 'confirmed'):
+        _unschedule(members)
+        return
+
+    now = datetime.utcnow()
+    due = {}
+    expired = []
+
+    for member, (window_start, window_end) in zip(members, REMINDER_WINDOWS.values()):
+        if appointment.start_datetime - window_start < now:
+            expired.append(member)
+            continue
+
+        due[member] = _timestamp(appointment.start_datetime - (window_start + window_end) / 2)
+
+    if expired:
+        _unschedule(expired)
+    if due:
+        _schedule(due)
+
+
+def next_weekly_invite(settings, timezone, now_utc=None):
+    """Próximo dia/hora local do convite semanal, em UTC"""
+    user_timezone = pytz.timezone(timezone)
+    now_local = pytz.utc.localize(now_utc or datetime.utcnow()).astimezone(user_timezone)
+
+    days_ahead = (settings.weekly_invite_dow - now_local.weekday()) % 7
+    candidate_day = now_local.date() + timedelta(days=days_ahead)
+
+    while True:
+        candidate = user_timezone.localize(
+            datetime.combine(candidate_day, datetime.min.time()).replace(hour=settings.weekly_invite_hour)
+        )
+        if candidate > now_local:
+            return candidate.astimezone(pytz.utc).replace(tzinfo=None)
+        candidate_day += timedelta(days=7)
+
+
+def schedule_weekly_invite(settings, timezone):
+    """Agenda o próximo convite semanal do profissional (ou remove, no modo C)"""
+    member = f'invite:{settings.user_id}'
+
+    if settings.mode == 'C':
+        _unschedule([member])
+        return
+
+    _schedule({member: _timestamp(next_weekly_invite(settings, timezone))})
+
+
+def pop_due(now=None, limit=POP_BATCH_SIZE):
+    """Retira e retorna os membros vencidos"""
+    now = now if now is not None else time.time()
+    items = conn.eval(_POP_DUE_SCRIPT, 1, SCHEDULE_KEY, now, limit)
+    return [item.decode() if isinstance(item, bytes) else item for item in items]
+
+
+def dispatch(member):
+    """Enfileira o job correspondente a um membro vencido"""
+    kind, _, rest = member.partition(':')
+
+    if kind == 'reminder':
+        appointment_id, reminder_kind = rest.split(':')
+        high_queue.enqueue('workers.send_appointment_reminder', int(appointment_id), reminder_kind)
+    elif kind == 'invite':
+        default_queue.enqueue('workers.send_weekly_invite', int(rest))
+
+
+def rebuild_schedule():
+    """Recria o conjunto a partir do banco (implantação inicial ou perda do Redis)"""
+    from worker_app import job_context
+    from models import User, Appointment, AutomationSetting
+
+    with job_context():
+        appointments = Appointment.query.filter(
+            Appointment.start_datetime > datetime.utcnow(),
+            Appointment.status.in_(['scheduled', 'confirmed'])
+        ).all()
+
+        for appointment in appointments:
+            schedule_reminders(appointment)
+
+        settings_rows = AutomationSetting.query.join(User, User.id == AutomationSetting.user_id).with_entities(
+            AutomationSetting, User.timezone
+        ).all()
+
+        for settings, timezone in settings_rows:
+            schedule_weekly_invite(settings, timezone)
+
+        return len(appointments), len(settings_rows)
+
+
+def run():
+    """Laço principal: enfileira o que venceu e dorme até o próximo vencimento"""
+    while True:
+        for member in pop_due():
+            dispatch(member)
+
+        upcoming = conn.zrange(SCHEDULE_KEY, 0, 0, withscores=True)
+        timeout = MAX_IDLE_SECONDS
+        if upcoming:
+            timeout = min(MAX_IDLE_SECONDS, max(0, upcoming[0][1] - time.time()))
+
+        if timeout > 0:
+            # Acorda no próximo vencimento ou quando algo novo for agendado
+            conn.blpop(WAKEUP_KEY, timeout=max(1, math.ceil(timeout)))
+            conn.delete(WAKEUP_KEY)
+
+
+# Inicialização do scheduler
+if __name__ == '__main__':
+    if '--rebuild' in sys.argv:
+        appointments, settings = rebuild_schedule()
+        print(f"Agendados lembretes de {appointments} sessões e {settings} convites semanais")
+    run()
@@ -0,0 +1,58 @@
+"""
+Benchmark do token_required: requisições por segundo em GET /availability
+com e sem os caches de autenticação (token verificado e usuário).
+
+Uso (a partir de backend/):
+    python -m scripts.bench_auth [--requests 2000]
+
+Usa um banco SQLite temporário e o test client do Flask (sem rede), então
+os números medem o custo por requisição dentro da aplicação.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_auth.db')}"
+
+from app import app  # noqa: E402
+import routes.auth as auth  # noqa: E402
+
+
+def measure(client, headers, count, clear_cache):
+    started = time.perf_counter()
+    for _ in range(count):
+        if clear_cache:
+            auth._token_cache.clear()
+            auth._user_cache.clear()
+        response = client.get('/availability', headers=headers)
+        assert response.status_code == 200, response.get_json()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    response = client.post('/auth/register', json={'name': 'Bench', 'email': 'bench@example.com', 'password': 'bench'})
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+    # Aquecimento
+    measure(client, headers, 100, clear_cache=False)
+
+    without_cache = measure(client, headers, args.requests, clear_cache=True)
+    with_cache = measure(client, headers, args.requests, clear_cache=False)
+
+    print(f'GET /availability, {args.requests} requisições')
+    print(f'sem cache: {without_cache:8.0f} req/s')
+    print(f'com cache: {with_cache:8.0f} req/s')
+    print(f'ganho:     {with_cache / without_cache:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
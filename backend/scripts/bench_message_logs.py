@@ -0,0 +1,96 @@
+"""
+Benchmark da gravação de MessageLog: um commit por mensagem (como antes)
+contra o MessageLogWriter, que agrupa as linhas em inserts em lote.
+Conta os commits feitos no banco e o tempo gasto só com os logs.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_message_logs [--messages 5000] [--flush-rows 200]
+
+Usa um banco SQLite temporário, a menos que --database-url seja informado.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--messages', type=int, default=5000)
+parser.add_argument('--flush-rows', type=int, default=200)
+parser.add_argument('--database-url', default=None)
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_logs.db')}"
+
+from datetime import datetime  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Patient, MessageLog  # noqa: E402
+from services.message_log_writer import MessageLogWriter  # noqa: E402
+
+
+def log_one_by_one(user_id, patient_ids, count):
+    for i in range(count):
+        db.session.add(MessageLog(
+            user_id=user_id,
+            patient_id=patient_ids[i % len(patient_ids)],
+            type='invite',
+            payload_json='{"content": "Convite", "buttons": []}',
+            status='sent',
+            timestamp=datetime.utcnow()
+        ))
+        db.session.commit()
+
+
+def log_buffered(user_id, patient_ids, count, flush_rows):
+    writer = MessageLogWriter(max_rows=flush_rows, max_delay_ms=60000)
+    for i in range(count):
+        writer.add(user_id, patient_ids[i % len(patient_ids)], 'invite', {'content': 'Convite', 'buttons': []}, 'sent')
+    # Fim do job
+    writer.flush()
+
+
+def measure(func, *func_args):
+    commits = [0]
+
+    def count_commit(conn):
+        commits[0] += 1
+
+    event.listen(db.engine, 'commit', count_commit)
+    started = time.perf_counter()
+    func(*func_args)
+    elapsed = time.perf_counter() - started
+    event.remove(db.engine, 'commit', count_commit)
+
+    return elapsed, commits[0]
+
+
+def main():
+    with app.app_context():
+        user = User(name='Bench', email='bench-logs@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        patients = [Patient(user_id=user.id, name=f'Paciente {i}', whatsapp=f'55119{i:08d}') for i in range(50)]
+        db.session.add_all(patients)
+        db.session.commit()
+        patient_ids = [patient.id for patient in patients]
+
+        before = MessageLog.query.count()
+        single_time, single_commits = measure(log_one_by_one, user.id, patient_ids, args.messages)
+        buffered_time, buffered_commits = measure(log_buffered, user.id, patient_ids, args.messages, args.flush_rows)
+        written = MessageLog.query.count() - before
+
+    assert written == 2 * args.messages, f'esperado {2 * args.messages} logs, gravados {written}'
+
+    print(f'{args.messages} logs de mensagem por modo, lotes de {args.flush_rows}')
+    print(f'um commit por log:  {single_commits:6d} commits  {args.messages / single_time:9.0f} logs/s  '
+          f'{single_commits / single_time:7.0f} commits/s')
+    print(f'buffer em lote:     {buffered_commits:6d} commits  {args.messages / buffered_time:9.0f} logs/s  '
+          f'{buffered_commits / buffered_time:7.0f} commits/s')
+    print(f'ganho:              {single_time / buffered_time:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Verifica o limitador de taxa adaptativo contra a API simulada com limite de
+vazão: envia a mesma rajada com e sem o limitador e compara a vazão, os 429
+recebidos e as mensagens que terminaram com falha.
+
+Requer o Redis de REDIS_URL (o estado do limitador é compartilhado por ele).
+
+Uso (a partir de backend/):
+    python -m scripts.bench_rate_limiter [--messages 600] [--api-rate 40] [--concurrency 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.fake_whatsapp_api import start_fake_api  # noqa: E402
+from services.rate_limiter import get_rate_limiter, phone_number_id_from_url  # noqa: E402
+from services.whatsapp_bulk import send_bulk  # noqa: E402
+from services.whatsapp_client import build_message_payload  # noqa: E402
+
+
+def run(url, payloads, server, concurrency, rate_limited):
+    server.throttled = 0
+    server.window.clear()
+
+    started = time.perf_counter()
+    results = send_bulk(iter(payloads), url=url, token='bench', concurrency=concurrency, rate_limited=rate_limited)
+    elapsed = time.perf_counter() - started
+
+    delivered = sum(1 for result in results if result.ok)
+    return delivered / elapsed, server.throttled, len(payloads) - delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=600)
+    parser.add_argument('--api-rate', type=int, default=40, help='limite da API simulada (msg/s)')
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    server, url = start_fake_api(latency_ms=args.latency_ms, rate_limit=args.api_rate)
+    payloads = [build_message_payload(f'55119{i:08d}', f'Mensagem {i}') for i in range(args.messages)]
+
+    # Estado limpo: o limitador começa em WHATSAPP_RATE_LIMIT e se ajusta ao limite real
+    limiter = get_rate_limiter(phone_number_id_from_url(url))
+    limiter._scripts()
+    limiter._connection.delete(limiter.key)
+
+    print(f'{args.messages} mensagens, API limitada a {args.api_rate} msg/s, '
+          f'limitador iniciando em {limiter.max_rate:.0f} msg/s')
+
+    for label, rate_limited in (('sem limitador', False), ('com limitador', True)):
+        rate, throttled, failed = run(url, payloads, server, args.concurrency, rate_limited)
+        print(f'{label}:  {rate:6.1f} entregues/s   429 recebidos: {throttled:5d}   falhas finais: {failed:5d}')
+
+    print(f'taxa final do limitador: {limiter.current_rate():.1f} msg/s')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
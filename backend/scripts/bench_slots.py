@@ -0,0 +1,131 @@
+"""
+Benchmark do gerador de slots: laço original de GET /availability/slots
+versus a varredura linear de services.slots, em semanas sintéticas.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_slots [--weeks 50] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.slots import iter_free_slots, format_slots  # noqa: E402
+
+Window = namedtuple('Window', ['weekday', 'start_time', 'end_time', 'duration_min', 'break_min'])
+Booking = namedtuple('Booking', ['start_datetime', 'end_datetime'])
+
+
+def legacy_slots(first_day, last_day, availability, appointments, blackout_dates, user_timezone):
+    """Reprodução do laço aninhado original da rota"""
+    booked_slots = {}
+    for appt in appointments:
+        booked_slots.setdefault(appt.start_datetime.date(), []).append({
+            'start': appt.start_datetime,
+            'end': appt.end_datetime
+        })
+
+    available_slots = []
+    current_date = first_day
+    while current_date <= last_day:
+        if current_date in blackout_dates:
+            current_date += timedelta(days=1)
+            continue
+
+        weekday = current_date.weekday()
+        for avail in [a for a in availability if a.weekday == weekday]:
+            slot_duration = timedelta(minutes=avail.duration_min)
+            break_duration = timedelta(minutes=avail.break_min)
+            start_dt = datetime.combine(current_date, avail.start_time)
+            end_dt = datetime.combine(current_date, avail.end_time)
+
+            current_slot_start = start_dt
+            while current_slot_start + slot_duration <= end_dt:
+                current_slot_end = current_slot_start + slot_duration
+                is_available = True
+                for booked in booked_slots.get(current_date, []):
+                    if current_slot_start < booked['end'] and current_slot_end > booked['start']:
+                        is_available = False
+                        break
+
+                if is_available:
+                    slot_start_local = pytz.utc.localize(current_slot_start).astimezone(user_timezone)
+                    slot_end_local = pytz.utc.localize(current_slot_end).astimezone(user_timezone)
+                    available_slots.append({
+                        'date': current_date.strftime('%Y-%m-%d'),
+                        'start': slot_start_local.strftime('%H:%M'),
+                        'end': slot_end_local.strftime('%H:%M'),
+                        'duration': avail.duration_min
+                    })
+
+                current_slot_start = current_slot_end + break_duration
+
+        current_date += timedelta(days=1)
+
+    return available_slots
+
+
+def build_week(first_day, rng, duration_min=15, bookings_per_day=25):
+    """Monta uma semana sintética: janelas longas, sessões curtas e agenda cheia"""
+    availability = [Window(weekday, time(6, 0), time(22, 0), duration_min, 0) for weekday in range(7)]
+
+    appointments = []
+    for offset in range(7):
+        day = first_day + timedelta(days=offset)
+        for _ in range(bookings_per_day):
+            start = datetime.combine(day, time(6, 0)) + timedelta(minutes=15 * rng.randrange(64))
+            appointments.append(Booking(start, start + timedelta(minutes=rng.choice([15, 30, 50]))))
+
+    blackout_dates = {first_day + timedelta(days=rng.randrange(7))}
+    return availability, appointments, blackout_dates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weeks', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    user_timezone = pytz.timezone('America/Sao_Paulo')
+    first_monday = date(2024, 1, 1)
+
+    weeks = []
+    for n in range(args.weeks):
+        first_day = first_monday + timedelta(weeks=n)
+        weeks.append((first_day, first_day + timedelta(days=6)) + build_week(first_day, rng))
+
+    def run_legacy():
+        return [legacy_slots(f, l, a, b, bl, user_timezone) for f, l, a, b, bl in weeks]
+
+    def run_sweep():
+        return [
+            format_slots(
+                iter_free_slots(f, l, a, [(x.start_datetime, x.end_datetime) for x in b], bl),
+                user_timezone
+            )
+            for f, l, a, b, bl in weeks
+        ]
+
+    key = lambda s: (s['date'], s['start'])
+    for old, new in zip(run_legacy(), run_sweep()):
+        assert sorted(old, key=key) == sorted(new, key=key), 'resultados divergentes'
+
+    legacy_time = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    sweep_time = min(timeit.repeat(run_sweep, number=1, repeat=args.repeat))
+
+    print(f'{args.weeks} semanas sintéticas (janelas 06-22h, sessões de 15 min)')
+    print(f'laço original:    {legacy_time * 1000 / args.weeks:8.2f} ms/semana')
+    print(f'varredura linear: {sweep_time * 1000 / args.weeks:8.2f} ms/semana')
+    print(f'ganho:            {legacy_time / sweep_time:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Conta as idas ao banco para processar uma rajada de respostas de botão do
+WhatsApp: um corpo de webhook por vez (uma transação por corpo) contra o
+lote do worker (services.webhook_processor.process_batch).
+
+Uso (a partir de backend/):
+    python -m scripts.bench_webhook_batch [--replies 500] [--messages-per-body 1]
+
+Usa um banco SQLite temporário.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_webhooks.db')}"
+
+from sqlalchemy import event  # noqa: E402
+from app import app  # noqa: E402
+from models import db, User, Patient, Appointment, MessageLog  # noqa: E402
+import services.webhook_processor as webhook_processor  # noqa: E402
+
+BUTTONS = ['Confirmar', 'Remarcar', 'Pausar', 'Confirmar', 'Remarcar']
+
+
+def build_bodies(count, per_body):
+    messages = [
+        {
+            'from': f'55119{i:08d}',
+            'id': f'wamid.bench{i}',
+            'type': 'interactive',
+            'interactive': {'type': 'button_reply', 'button_reply': {'id': 'btn_0', 'title': BUTTONS[i % len(BUTTONS)]}}
+        }
+        for i in range(count)
+    ]
+    return [
+        json.dumps({'entry': [{'changes': [{'value': {'messages': messages[i:i + per_body]}}]}]})
+        for i in range(0, count, per_body)
+    ]
+
+
+def reset():
+    db.session.query(MessageLog).delete()
+    db.session.query(Appointment).update({'status': 'scheduled'})
+    db.session.query(Patient).update({'status': 'active'})
+    db.session.commit()
+
+
+def measure(func):
+    statements = [0]
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    return statements[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replies', type=int, default=500)
+    parser.add_argument('--messages-per-body', type=int, default=1)
+    args = parser.parse_args()
+
+    # Ações fora do banco (Redis) não entram na contagem; sem deduplicação,
+    # as duas rodadas processam as mesmas mensagens
+    webhook_processor._after_status_change = lambda appointment: None
+    webhook_processor.webhook_dedup.claim = lambda messages: messages
+    webhook_processor.take_pending_statuses = lambda connection: []
+
+    with app.app_context():
+        user = User(name='Bench', email='bench-webhooks@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+
+        start = datetime.utcnow() + timedelta(days=2)
+        patients = [Patient(user_id=user.id, name=f'Paciente {i}', whatsapp=f'55119{i:08d}') for i in range(args.replies)]
+        db.session.add_all(patients)
+        db.session.flush()
+        db.session.add_all([
+            Appointment(user_id=user.id, patient_id=patient.id, start_datetime=start,
+                        end_datetime=start + timedelta(minutes=50), status='scheduled')
+            for patient in patients
+        ])
+        db.session.commit()
+
+        bodies = build_bodies(args.replies, args.messages_per_body)
+
+        reset()
+        single_statements, single_time = measure(lambda: [webhook_processor.process_batch([body]) for body in bodies])
+        single_logs = MessageLog.query.count()
+
+        reset()
+        batch_statements, batch_time = measure(lambda: webhook_processor.process_batch(bodies))
+        batch_logs = MessageLog.query.count()
+
+    assert single_logs == batch_logs == args.replies, (single_logs, batch_logs)
+
+    print(f'{args.replies} respostas em {len(bodies)} corpos de webhook')
+    print(f'um corpo por transação:  {single_statements:6d} comandos SQL  {single_time * 1000:8.1f} ms')
+    print(f'lote único:              {batch_statements:6d} comandos SQL  {batch_time * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
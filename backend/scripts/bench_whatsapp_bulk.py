@@ -0,0 +1,75 @@
+"""
+Verifica e mede o envio em massa assíncrono contra a API simulada, com
+latência e erros injetados: compara o envio sequencial pelo WhatsAppClient
+com services.whatsapp_bulk e confere a ordem e os erros dos resultados.
+
+Os jobs que enviam por services.whatsapp_bulk (workers.send_message_batch,
+usado pelos convites e lembretes) são cobertos por tests/test_whatsapp_bulk.py.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_whatsapp_bulk [--messages 1000] [--latency-ms 80] [--concurrency 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.fake_whatsapp_api import start_fake_api  # noqa: E402
+from services.whatsapp_bulk import send_bulk  # noqa: E402
+from services.whatsapp_client import WhatsAppClient, build_message_payload  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--sequential', type=int, default=100, help='mensagens no envio sequencial de referência')
+    args = parser.parse_args()
+
+    server, url = start_fake_api(latency_ms=args.latency_ms, error_rate=args.error_rate)
+
+    payloads = [
+        build_message_payload(f'55119{i:08d}', f'Mensagem {i}', ['Confirmar'] if i % 2 else None)
+        for i in range(args.messages)
+    ]
+    # Destinatários que sempre falham, para conferir a posição dos erros
+    forced_errors = {7: 400, len(payloads) // 2: 500}
+    for index, status in forced_errors.items():
+        payloads[index]['to'] = f'fail:{status}'
+
+    # Referência: envio sequencial com conexão reaproveitada
+    client = WhatsAppClient()
+    started = time.perf_counter()
+    for payload in payloads[:args.sequential]:
+        client.post_message(url, 'bench', payload)
+    sequential_rate = args.sequential / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    results = send_bulk(iter(payloads), url=url, token='bench', concurrency=args.concurrency)
+    bulk_rate = len(payloads) / (time.perf_counter() - started)
+
+    assert len(results) == len(payloads), 'quantidade de resultados diferente da entrada'
+    for index, status in forced_errors.items():
+        assert results[index].status == status and not results[index].ok, f'erro fora de ordem em {index}'
+    for index, result in enumerate(results):
+        if result.ok:
+            assert result.data['contacts'][0]['input'] == payloads[index]['to'], f'resultado fora de ordem em {index}'
+
+    failed = sum(1 for result in results if not result.ok)
+
+    print(f'{len(payloads)} mensagens, latência ~{args.latency_ms:.0f} ms, {args.error_rate:.0%} de erros injetados')
+    print(f'sequencial (pool):          {sequential_rate:8.0f} msg/s')
+    print(f'assíncrono ({args.concurrency:3d} em voo):   {bulk_rate:8.0f} msg/s')
+    print(f'falhas reportadas:          {failed:8d}')
+    print('ordem dos resultados e erros forçados conferidos')
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark de envio para a WhatsApp Cloud API contra um servidor HTTP local:
+requests.post (conexão nova por mensagem) versus o WhatsAppClient com pool
+de conexões keep-alive.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_whatsapp_http [--messages 2000] [--threads 8]
+
+O servidor local não usa TLS, então o ganho medido aqui é só o do
+handshake TCP; contra a API real o handshake TLS aumenta a diferença.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.whatsapp_client import WhatsAppClient  # noqa: E402
+
+PAYLOAD = {
+    "messaging_product": "whatsapp",
+    "recipient_type": "individual",
+    "to": "5511999999999",
+    "type": "text",
+    "text": {"body": "Olá! Confirma sua sessão desta semana?"}
+}
+
+
+class FakeCloudAPI(BaseHTTPRequestHandler):
+    """Responde como o endpoint /messages, mantendo a conexão aberta"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({"messages": [{"id": "wamid.bench"}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(send, messages, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for response in executor.map(lambda _: send(), range(messages)):
+            assert response.status_code == 200
+    return messages / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCloudAPI)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/v17.0/123/messages'
+
+    headers = {"Authorization": "Bearer bench", "Content-Type": "application/json"}
+    client = WhatsAppClient(pool_size=args.threads)
+
+    def without_pool():
+        return requests.post(url, headers=headers, data=json.dumps(PAYLOAD))
+
+    def with_pool():
+        return client.post_message(url, 'bench', PAYLOAD)
+
+    run(with_pool, 50, args.threads)  # Aquecimento
+
+    plain = run(without_pool, args.messages, args.threads)
+    pooled = run(with_pool, args.messages, args.threads)
+
+    print(f'{args.messages} mensagens, {args.threads} threads, servidor local')
+    print(f'requests.post (sem reuso): {plain:8.0f} msg/s')
+    print(f'WhatsAppClient (pool):     {pooled:8.0f} msg/s')
+    print(f'ganho:                     {pooled / plain:8.2f}x')
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
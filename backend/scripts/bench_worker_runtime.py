@@ -0,0 +1,115 @@
+"""
+Mede o custo de inicialização de um job e o custo fixo por mensagem nos
+workers: `from app import app` + um app context por mensagem (antes)
+contra o app mínimo de worker_app criado uma vez e um contexto por job.
+
+- inicialização: cada job roda em um processo filho (fork), como no RQ;
+  mede do fork até o fim de um job que faz uma consulta.
+- por mensagem: abre o contexto e carrega profissional e paciente, como
+  send_whatsapp_message faz antes de enviar.
+
+Uso (a partir de backend/):
+    python -m scripts.bench_worker_runtime [--jobs 20] [--messages 2000]
+
+Usa um banco SQLite temporário.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_worker.db')}"
+
+from models import db, User, Patient  # noqa: E402
+from worker_app import get_worker_app, job_context  # noqa: E402
+
+
+def job_before():
+    from app import app
+
+    with app.app_context():
+        User.query.get(1)
+
+
+def job_after():
+    with job_context():
+        User.query.get(1)
+
+
+def fork_jobs(job, count):
+    """Tempo médio (ms) do fork até o fim de cada job"""
+    elapsed = 0
+    for _ in range(count):
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                job()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        elapsed += time.perf_counter() - started
+    return elapsed / count * 1000
+
+
+def messages_before(patient_ids):
+    from app import app
+
+    started = time.perf_counter()
+    for patient_id in patient_ids:
+        from app import app  # noqa: F811 (como em cada chamada de send_whatsapp_message)
+
+        with app.app_context():
+            User.query.get(1)
+            Patient.query.get(patient_id)
+    return (time.perf_counter() - started) / len(patient_ids) * 1e6
+
+
+def messages_after(patient_ids):
+    started = time.perf_counter()
+    with job_context():
+        for patient_id in patient_ids:
+            with job_context():
+                User.query.get(1)
+                Patient.query.get(patient_id)
+    return (time.perf_counter() - started) / len(patient_ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+
+    # Processo principal do worker: app mínimo criado antes dos forks
+    with get_worker_app().app_context():
+        db.create_all()
+        user = User(name='Bench', email='bench-worker@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        patients = [Patient(user_id=user.id, name=f'Paciente {i}', whatsapp=f'55119{i:08d}') for i in range(args.messages)]
+        db.session.add_all(patients)
+        db.session.commit()
+        patient_ids = [patient.id for patient in patients]
+        db.engine.dispose()
+
+    # Inicialização: o processo principal nunca importa app.py
+    startup_before = fork_jobs(job_before, args.jobs)
+    startup_after = fork_jobs(job_after, args.jobs)
+
+    per_message_after = messages_after(patient_ids)
+    per_message_before = messages_before(patient_ids)
+
+    print(f'inicialização do job ({args.jobs} forks):')
+    print(f'  from app import app: {startup_before:8.1f} ms')
+    print(f'  worker_app:          {startup_after:8.1f} ms')
+    print(f'custo fixo por mensagem ({args.messages} mensagens):')
+    print(f'  contexto por envio:  {per_message_before:8.1f} µs')
+    print(f'  contexto do job:     {per_message_after:8.1f} µs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Inspeciona e reenvia mensagens que esgotaram as tentativas de envio
+(dead-letter do WhatsApp, ver services/send_retry.py). Com --webhooks, age
+sobre os webhooks recebidos que não puderam ser aplicados (ver
+services/webhook_processor.py).
+
+Uso (a partir de backend/):
+    python -m scripts.dead_letters list [--webhooks] [--start 0] [--count 20]
+    python -m scripts.dead_letters replay [--webhooks] [--limit N]
+    python -m scripts.dead_letters purge [--webhooks]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.send_retry import (  # noqa: E402
+    count_dead_letters, list_dead_letters, purge_dead_letters, replay_dead_letters
+)
+from services.webhook_processor import (  # noqa: E402
+    count_failed_webhooks, list_failed_webhooks, purge_failed_webhooks, replay_failed_webhooks
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='lista os envios da dead-letter')
+    list_parser.add_argument('--start', type=int, default=0)
+    list_parser.add_argument('--count', type=int, default=20)
+
+    replay_parser = subparsers.add_parser('replay', help='reenfileira os envios na fila retry')
+    replay_parser.add_argument('--limit', type=int, default=None)
+
+    purge_parser = subparsers.add_parser('purge', help='remove todos os envios da dead-letter')
+
+    for command_parser in (list_parser, replay_parser, purge_parser):
+        command_parser.add_argument('--webhooks', action='store_true', help='dead-letter de webhooks recebidos')
+    args = parser.parse_args()
+
+    if args.webhooks:
+        from workers import conn
+
+        if args.command == 'list':
+            print(f'{count_failed_webhooks(conn)} webhooks na dead-letter')
+            for position, entry in enumerate(list_failed_webhooks(conn, args.start, args.count), start=args.start):
+                print(f"[{position}] {entry['failed_at']} - {entry['attempts']} tentativas: {entry['error']}")
+                print(f"    {entry['body'][:200]}")
+        elif args.command == 'replay':
+            print(f'{replay_failed_webhooks(conn, args.limit)} webhooks devolvidos à fila')
+        elif args.command == 'purge':
+            print(f'{purge_failed_webhooks(conn)} webhooks removidos')
+        return
+
+    if args.command == 'list':
+        print(f'{count_dead_letters()} envios na dead-letter')
+        for position, entry in enumerate(list_dead_letters(args.start, args.count), start=args.start):
+            print(f"[{position}] {entry['failed_at']} usuário {entry['user_id']} paciente {entry['patient_id']} "
+                  f"{entry['message_type']} - {entry['attempts']} tentativas, "
+                  f"status {entry['status_code']}: {entry['error']}")
+
+    elif args.command == 'replay':
+        print(f'{replay_dead_letters(args.limit)} envios reenfileirados')
+
+    elif args.command == 'purge':
+        print(f'{purge_dead_letters()} envios removidos')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Servidor local que imita o endpoint /messages da WhatsApp Cloud API,
+com latência e erros injetados, para testes e benchmarks de envio.
+Opcionalmente limita a vazão (mensagens por segundo), respondendo 429
+com Retry-After acima do limite, como a API real faz por número.
+
+Uso (a partir de backend/):
+    python -m scripts.fake_whatsapp_api [--port 8089] [--latency-ms 80] [--error-rate 0.05] [--rate-limit 0]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeCloudAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+        with server.lock:
+            server.requests += 1
+            message_number = server.requests
+            delay = server.rng.uniform(0.5, 1.5) * server.latency
+            fail = server.rng.random() < server.error_rate
+
+            # Janela deslizante de 1 segundo para o limite de vazão
+            throttled = False
+            if server.rate_limit:
+                now = time.monotonic()
+                while server.window and server.window[0] <= now - 1:
+                    server.window.popleft()
+                if len(server.window) >= server.rate_limit:
+                    throttled = True
+                    server.throttled += 1
+                else:
+                    server.window.append(now)
+
+        time.sleep(delay)
+
+        # O texto "fail:<status>" força um erro específico para o destinatário
+        forced = str(payload.get('to', ''))
+        if forced.startswith('fail:'):
+            status = int(forced.split(':')[1])
+        elif throttled:
+            status = 429
+        else:
+            status = server.rng.choice([429, 500, 503]) if fail else 200
+
+        if status == 200:
+            body = {
+                "messaging_product": "whatsapp",
+                "contacts": [{"input": payload.get('to'), "wa_id": payload.get('to')}],
+                "messages": [{"id": f"wamid.fake{message_number}"}]
+            }
+        else:
+            body = {"error": {"message": "Erro simulado", "code": status}}
+
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_api(port=0, latency_ms=50, error_rate=0.0, seed=42, rate_limit=0):
+    """
+    Inicia o servidor em uma thread
+
+    `rate_limit` é o máximo de mensagens aceitas por segundo (0 = sem limite);
+    o total de respostas 429 por excesso fica em `servidor.throttled`.
+
+    Returns:
+        tuple: (servidor, URL do endpoint /messages)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeCloudAPIHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.error_rate = error_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.rate_limit = rate_limit
+    server.window = deque()
+    server.throttled = 0
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v17.0/123456/messages'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--rate-limit', type=int, default=0)
+    args = parser.parse_args()
+
+    server, url = start_fake_api(args.port, args.latency_ms, args.error_rate, rate_limit=args.rate_limit)
+    print(f'API simulada em {url}')
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
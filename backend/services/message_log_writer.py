@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, MessageLog
+
+# Descarga do buffer: a cada N linhas ou T milissegundos desde a primeira linha pendente
+LOG_FLUSH_ROWS = int(os.getenv('MESSAGE_LOG_FLUSH_ROWS', 200))
+LOG_FLUSH_MS = int(os.getenv('MESSAGE_LOG_FLUSH_MS', 1000))
+
+
+class MessageLogWriter:
+    """
+    Buffer (por processo) de linhas de MessageLog gravadas com um insert em lote
+
+    `add` apenas acumula a linha; quando o buffer atinge `max_rows` ou a linha
+    mais antiga passa de `max_delay_ms`, as linhas pendentes são gravadas em
+    uma única transação. O restante é gravado por `flush`, chamado ao fim de
+    cada job do worker, ao fim de cada requisição e no encerramento do
+    processo. Precisa de um app context ativo para gravar.
+
+    A gravação usa uma conexão própria do engine, nunca a sessão do
+    chamador: o flush do teardown roda também quando a rota falhou, e não
+    pode commitar (nem descartar) o que ela deixou pendente na sessão.
+    """
+
+    def __init__(self, max_rows=LOG_FLUSH_ROWS, max_delay_ms=LOG_FLUSH_MS):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.rows_written = 0
+        self.flushes = 0
+        self._rows = []
+        self._first_at = None
+        self._lock = threading.Lock()
+
+    def add(self, user_id, patient_id, message_type, payload, status, timestamp=None, wamid=None):
+        """
+        Acumula um log de mensagem
+
+        Args:
+            user_id: ID do psicólogo
+            patient_id: ID do paciente
+            message_type: Tipo da mensagem (invite, reminder_d1, etc)
+            payload: Dict gravado em payload_json
+            status: sent ou failed
+            timestamp: Momento do envio (padrão: agora, em UTC)
+            wamid: ID da mensagem retornado pela API, usado pelos callbacks de status
+        """
+        row = {
+            'user_id': user_id,
+            'patient_id': patient_id,
+            'type': message_type,
+            'payload_json': json.dumps(payload),
+            'status': status,
+            'wamid': wamid,
+            'timestamp': timestamp or datetime.utcnow()
+        }
+
+        with self._lock:
+            if not self._rows:
+                self._first_at = time.monotonic()
+            self._rows.append(row)
+            due = len(self._rows) >= self.max_rows or time.monotonic() - self._first_at >= self.max_delay
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Grava as linhas pendentes com um único insert; retorna quantas foram gravadas"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._first_at = None
+
+        if not rows:
+            return 0
+
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(MessageLog), rows)
+        except Exception as e:
+            print(f"Erro ao gravar {len(rows)} logs de mensagem: {str(e)}")
+            return 0
+
+        with self._lock:
+            self.rows_written += len(rows)
+            self.flushes += 1
+
+        return len(rows)
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
+
+
+# Instância global do writer
+message_log_writer = MessageLogWriter()
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import redis
+from sqlalchemy import update
+from models import MessageLog, db
+
+# Status que cada callback pode substituir: o status de um log nunca regride
+# (um "delivered" atrasado não desfaz um "read")
+STATUS_UPGRADES = {
+    'failed': ('sent',),
+    'delivered': ('sent',),
+    'read': ('sent', 'delivered'),
+}
+
+# Ordem de aplicação dentro de um lote, do menos ao mais avançado
+STATUS_ORDER = ('failed', 'delivered', 'read')
+
+# wamids por comando UPDATE
+STATUS_UPDATE_CHUNK = 500
+
+# Callbacks que chegaram antes do log existir (o log é gravado em lote pelo
+# worker de envio); são reaplicados nos lotes seguintes até expirar
+PENDING_STATUSES_KEY = 'webhook:statuses:pending'
+PENDING_STATUS_TTL = int(os.getenv('WEBHOOK_PENDING_STATUS_TTL', 300))
+
+
+def iter_statuses(payloads):
+    """Callbacks de status (wamid, status) de uma lista de notificações"""
+    for data in payloads:
+        for entry in data.get('entry', []):
+            for change in entry.get('changes', []):
+                for status in change.get('value', {}).get('statuses', []):
+                    if status.get('id') and status.get('status') in STATUS_UPGRADES:
+                        yield status['id'], status['status']
+
+
+def _chunks(items, size=STATUS_UPDATE_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def apply_status_updates(statuses):
+    """
+    Aplica callbacks de status aos logs com UPDATE ... WHERE wamid IN (...)
+
+    Um comando por status de destino (e por bloco de STATUS_UPDATE_CHUNK
+    wamids), sem commit; quem chama faz o commit junto com o resto do lote.
+
+    Args:
+        statuses: Iterável de (wamid, status)
+
+    Returns:
+        tuple: (logs atualizados, lista de (wamid, status) cujos logs ainda
+               não existem); pares repetidos contam uma vez e callbacks que
+               não avançam o status não contam
+    """
+    by_status = {}
+    for wamid, status in statuses:
+        by_status.setdefault(status, set()).add(wamid)
+
+    if not by_status:
+        return 0, []
+
+    wamids = sorted(set().union(*by_status.values()))
+    found = set()
+    for chunk in _chunks(wamids):
+        found.update(wamid for (wamid,) in db.session.query(MessageLog.wamid).filter(MessageLog.wamid.in_(chunk)))
+
+    updated = 0
+    for status in STATUS_ORDER:
+        targets = sorted(by_status.get(status, set()) & found)
+        for chunk in _chunks(targets):
+            updated += db.session.execute(
+                update(MessageLog)
+                .where(MessageLog.wamid.in_(chunk), MessageLog.status.in_(STATUS_UPGRADES[status]))
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+    return updated, [
+        (wamid, status)
+        for status in STATUS_ORDER
+        for wamid in sorted(by_status.get(status, set()) - found)
+    ]
+
+
+def take_pending_statuses(connection):
+    """Retira os callbacks pendentes ainda válidos; retorna lista de (wamid, status, primeira_vez)"""
+    now = time.time()
+    try:
+        pipe = connection.pipeline()
+        pipe.zremrangebyscore(PENDING_STATUSES_KEY, '-inf', now - PENDING_STATUS_TTL)
+        pipe.zrange(PENDING_STATUSES_KEY, 0, -1, withscores=True)
+        pipe.delete(PENDING_STATUSES_KEY)
+        _, members, _ = pipe.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao ler callbacks de status pendentes: {str(e)}")
+        return []
+
+    return [tuple(json.loads(member)) + (first_seen,) for member, first_seen in members]
+
+
+def park_pending_statuses(connection, pending):
+    """Guarda callbacks sem log para uma nova tentativa; `pending` é lista de (wamid, status, primeira_vez)"""
+    if not pending:
+        return
+
+    try:
+        connection.zadd(PENDING_STATUSES_KEY, {
+            json.dumps([wamid, status]): first_seen for wamid, status, first_seen in pending
+        })
+    except redis.exceptions.RedisError as e:
+        print(f"Erro ao guardar callbacks de status pendentes: {str(e)}")
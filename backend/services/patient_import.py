@@ -0,0 +1,207 @@
+import os
+import io
+import csv
+import uuid
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert
+from models import Patient, db
+
+# Linhas processadas por lote (uma consulta de duplicidade e um INSERT por lote)
+CHUNK_SIZE = int(os.getenv('PATIENT_IMPORT_CHUNK_SIZE', 500))
+
+# Arquivos maiores que este limite são importados em background (RQ)
+ASYNC_THRESHOLD_BYTES = int(os.getenv('PATIENT_IMPORT_ASYNC_BYTES', 256 * 1024))
+
+# Tamanho máximo aceito para o arquivo de importação
+MAX_FILE_BYTES = int(os.getenv('PATIENT_IMPORT_MAX_BYTES', 20 * 1024 * 1024))
+
+# Tempo de vida do arquivo e do status da importação no Redis
+JOB_TTL_SECONDS = 24 * 60 * 60
+
+
+def iter_csv_rows(binary_stream):
+    """Decodifica e lê o CSV (separado por ';') de forma incremental"""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+    return csv.reader(text_stream, delimiter=';')
+
+
+def import_rows(user_id, rows, progress=None):
+    """
+    Importa pacientes em lotes
+
+    Cada lote é validado e deduplicado em memória, comparado com os números
+    já cadastrados por uma única consulta IN e gravado com um INSERT em
+    massa. Linhas inválidas, duplicadas no arquivo ou já cadastradas contam
+    como erro.
+
+    Nada é commitado aqui: os lotes ficam na transação da sessão e quem
+    chama faz um único commit no fim. Assim um arquivo fora de UTF-8 (o
+    UnicodeDecodeError só aparece quando a leitura chega no trecho inválido)
+    ou um erro do banco no meio do arquivo não deixam importação parcial.
+
+    Args:
+        user_id: ID do psicólogo
+        rows: Iterável de linhas do CSV (nome; whatsapp)
+        progress: Função chamada após cada lote com (processadas, importadas, erros)
+
+    Raises:
+        UnicodeDecodeError: Se o arquivo não estiver em UTF-8
+
+    Returns:
+        dict: Totais de processed, imported e errors
+    """
+    rows = iter(rows)
+    seen = set()
+    processed = imported = errors = 0
+
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+
+        processed += len(chunk)
+        candidates = {}
+
+        for row in chunk:
+            if len(row) < 2:
+                errors += 1
+                continue
+
+            name = row[0].strip()
+            whatsapp = ''.join(filter(str.isdigit, row[1]))
+
+            if not name or not whatsapp or whatsapp in seen:
+                errors += 1
+                continue
+
+            seen.add(whatsapp)
+            candidates[whatsapp] = name
+
+        if candidates:
+            existing = {
+                whatsapp for (whatsapp,) in db.session.query(Patient.whatsapp).filter(
+                    Patient.user_id == user_id,
+                    Patient.whatsapp.in_(list(candidates))
+                )
+            }
+            errors += len(existing)
+
+            now = datetime.utcnow()
+            new_patients = [
+                {
+                    'user_id': user_id,
+                    'name': name,
+                    'whatsapp': whatsapp,
+                    'status': 'active',
+                    'preferences_json': '{}',
+                    'created_at': now
+                }
+                for whatsapp, name in candidates.items()
+                if whatsapp not in existing
+            ]
+
+            if new_patients:
+                db.session.execute(insert(Patient), new_patients)
+                imported += len(new_patients)
+
+        if progress:
+            progress(processed, imported, errors)
+
+    return {'processed': processed, 'imported': imported, 'errors': errors}
+
+
+def _status_key(import_id):
+    return f'patient_import:{import_id}'
+
+
+def _file_key(import_id):
+    return f'patient_import:{import_id}:file'
+
+
+def enqueue_import(user_id, content):
+    """
+    Guarda o arquivo (bytes) no Redis e agenda a importação em background
+
+    Returns:
+        str: ID da importação (para consulta de status)
+    """
+    from workers import conn, default_queue
+
+    import_id = uuid.uuid4().hex
+
+    pipe = conn.pipeline()
+    pipe.set(_file_key(import_id), content, ex=JOB_TTL_SECONDS)
+    pipe.hset(_status_key(import_id), mapping={
+        'user_id': user_id,
+        'status': 'queued',
+        'processed': 0,
+        'imported': 0,
+        'errors': 0
+    })
+    pipe.expire(_status_key(import_id), JOB_TTL_SECONDS)
+    pipe.execute()
+
+    default_queue.enqueue('workers.import_patients_job', import_id, job_timeout=30 * 60)
+
+    return import_id
+
+
+def get_import_status(import_id):
+    """Retorna o status da importação ou None se não existir"""
+    from workers import conn
+
+    data = conn.hgetall(_status_key(import_id))
+    if not data:
+        return None
+
+    data = {k.decode(): v.decode() for k, v in data.items()}
+    for field in ('user_id', 'processed', 'imported', 'errors'):
+        data[field] = int(data[field])
+
+    return data
+
+
+def run_import(import_id):
+    """
+    Executa a importação agendada, atualizando o progresso no Redis
+
+    A importação é gravada em uma única transação: se falhar (arquivo fora
+    de UTF-8 ou erro do banco), nenhum paciente fica cadastrado e o status
+    registra até onde a leitura chegou, com imported zerado.
+    """
+    from workers import conn
+
+    status_key = _status_key(import_id)
+    user_id = conn.hget(status_key, 'user_id')
+    content = conn.get(_file_key(import_id))
+
+    if user_id is None or content is None:
+        return None
+
+    conn.hset(status_key, 'status', 'running')
+
+    def progress(processed, imported, errors):
+        conn.hset(status_key, mapping={'processed': processed, 'imported': imported, 'errors': errors})
+
+    try:
+        result = import_rows(int(user_id), iter_csv_rows(io.BytesIO(content)), progress)
+        db.session.commit()
+    except UnicodeDecodeError:
+        db.session.rollback()
+        conn.hset(status_key, mapping={
+            'status': 'failed',
+            'imported': 0,
+            'error': 'Arquivo CSV deve estar em UTF-8'
+        })
+        conn.delete(_file_key(import_id))
+        return None
+    except Exception as e:
+        db.session.rollback()
+        conn.hset(status_key, mapping={'status': 'failed', 'imported': 0, 'error': str(e)})
+        raise
+
+    conn.hset(status_key, 'status', 'finished')
+    conn.delete(_file_key(import_id))
+
+    return result
@@ -0,0 +1,182 @@
+import os
+import time
+import redis
+
+# Limites de envio por número do WhatsApp (mensagens por segundo)
+MAX_RATE = float(os.getenv('WHATSAPP_RATE_LIMIT', 80))
+MIN_RATE = float(os.getenv('WHATSAPP_RATE_MIN', 1))
+BURST = float(os.getenv('WHATSAPP_RATE_BURST', 20))
+# Aumento da taxa a cada envio bem-sucedido (mensagens por segundo)
+INCREASE = float(os.getenv('WHATSAPP_RATE_INCREASE', 0.2))
+# Fator aplicado à taxa a cada 429
+DECREASE = float(os.getenv('WHATSAPP_RATE_DECREASE', 0.7))
+
+# Pausa usada quando um 429 chega sem Retry-After (segundos)
+DEFAULT_RETRY_AFTER = 1.0
+
+# Estado: tokens, ts (último cálculo), rate (taxa atual) e pause_until
+_ACQUIRE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate', 'pause_until')
+local now = tonumber(ARGV[1])
+local max_rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+local rate = tonumber(state[3]) or max_rate
+local pause_until = tonumber(state[4]) or 0
+
+if now < pause_until then
+    return tostring(pause_until - now)
+end
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'rate', rate)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+# Aumento aditivo a cada sucesso, redução multiplicativa a cada 429 (AIMD)
+_FEEDBACK_SCRIPT = """
+local now = tonumber(ARGV[1])
+local max_rate = tonumber(ARGV[2])
+local min_rate = tonumber(ARGV[3])
+local throttled = tonumber(ARGV[4])
+local retry_after = tonumber(ARGV[5])
+local increase = tonumber(ARGV[6])
+local decrease = tonumber(ARGV[7])
+
+local state = redis.call('HMGET', KEYS[1], 'rate', 'pause_until')
+local rate = tonumber(state[1]) or max_rate
+local pause_until = tonumber(state[2]) or 0
+
+if throttled == 1 then
+    -- Respostas 429 de requisições que já estavam em voo durante a pausa
+    -- não reduzem a taxa de novo
+    if now >= pause_until then
+        rate = math.max(min_rate, rate * decrease)
+    end
+    redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', 0, 'ts', now,
+               'pause_until', math.max(pause_until, now + retry_after))
+else
+    rate = math.min(max_rate, rate + increase)
+    redis.call('HSET', KEYS[1], 'rate', rate)
+end
+
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(rate)
+"""
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket compartilhado entre workers (Redis), por número do WhatsApp
+
+    A taxa começa em WHATSAPP_RATE_LIMIT. Um 429 multiplica a taxa por
+    WHATSAPP_RATE_DECREASE e pausa os envios de todos os workers pelo tempo
+    do Retry-After; cada envio bem-sucedido soma WHATSAPP_RATE_INCREASE à taxa,
+    até o limite. Se o Redis estiver indisponível, os envios não são
+    bloqueados.
+    """
+
+    def __init__(self, phone_number_id, connection=None, max_rate=MAX_RATE, min_rate=MIN_RATE, burst=BURST,
+                 increase=INCREASE):
+        self.key = f"ratelimit:whatsapp:{phone_number_id}"
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.increase = increase
+        self._connection = connection
+        self._acquire = None
+        self._feedback = None
+        self._warned = False
+
+    def _scripts(self):
+        if self._acquire is None:
+            if self._connection is None:
+                from workers import conn
+                self._connection = conn
+            self._acquire = self._connection.register_script(_ACQUIRE_SCRIPT)
+            self._feedback = self._connection.register_script(_FEEDBACK_SCRIPT)
+        return self._acquire, self._feedback
+
+    def try_acquire(self):
+        """Tenta consumir um token; retorna 0 ou os segundos a esperar antes de tentar de novo"""
+        try:
+            acquire, _ = self._scripts()
+            return float(acquire(keys=[self.key], args=[time.time(), self.max_rate, self.burst]))
+        except redis.exceptions.RedisError as e:
+            self._warn(e)
+            return 0.0
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível"""
+        wait = self.try_acquire()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+    def feedback(self, status_code, retry_after=None):
+        """
+        Ajusta a taxa conforme a resposta da API
+
+        Args:
+            status_code: Status HTTP da resposta
+            retry_after: Valor do header Retry-After (segundos), se houver
+        """
+        throttled = status_code == 429
+        if not throttled and status_code != 200:
+            return
+
+        try:
+            pause = float(retry_after) if retry_after else DEFAULT_RETRY_AFTER
+        except ValueError:
+            pause = DEFAULT_RETRY_AFTER
+
+        try:
+            _, feedback = self._scripts()
+            feedback(keys=[self.key], args=[time.time(), self.max_rate, self.min_rate, int(throttled), pause, self.increase, DECREASE])
+        except redis.exceptions.RedisError as e:
+            self._warn(e)
+
+    def current_rate(self):
+        """Taxa atual em mensagens por segundo"""
+        try:
+            self._scripts()
+            rate = self._connection.hget(self.key, 'rate')
+        except redis.exceptions.RedisError:
+            return None
+        return float(rate) if rate is not None else self.max_rate
+
+    def _warn(self, error):
+        # Avisa uma vez por processo para não poluir o log a cada envio
+        if not self._warned:
+            print(f"Limitador indisponível, enviando sem controle de taxa: {str(error)}")
+            self._warned = True
+
+
+_limiters = {}
+
+
+def phone_number_id_from_url(url):
+    """Extrai o phone_number_id de um endpoint .../<phone_number_id>/messages"""
+    parts = (url or '').rstrip('/').split('/')
+    if len(parts) >= 2 and parts[-1] == 'messages':
+        return parts[-2]
+    return None
+
+
+def get_rate_limiter(phone_number_id=None):
+    """Retorna o limitador (por processo) do número informado ou de WHATSAPP_PHONE_NUMBER_ID"""
+    phone_number_id = phone_number_id or os.getenv('WHATSAPP_PHONE_NUMBER_ID', 'default')
+    if phone_number_id not in _limiters:
+        _limiters[phone_number_id] = AdaptiveRateLimiter(phone_number_id)
+    return _limiters[phone_number_id]
@@ -0,0 +1,43 @@
+from collections import namedtuple
+from models import db, User, Patient
+
+# Dados de um destinatário necessários para o envio (serializável para o RQ)
+Recipient = namedtuple('Recipient', [
+    'patient_id', 'name', 'whatsapp', 'status', 'user_id', 'user_name', 'timezone'
+])
+
+# Colunas na ordem dos campos de Recipient (paciente junto com o profissional)
+RECIPIENT_COLUMNS = (
+    Patient.id, Patient.name, Patient.whatsapp, Patient.status,
+    User.id, User.name, User.timezone
+)
+
+
+def _query(user_id):
+    return db.session.query(*RECIPIENT_COLUMNS).join(
+        User, User.id == Patient.user_id
+    ).filter(
+        Patient.user_id == user_id
+    )
+
+
+def load_recipients(user_id, patient_ids):
+    """
+    Carrega os destinatários de um lote com uma única consulta
+
+    Returns:
+        dict: patient_id -> Recipient (pacientes inexistentes ficam de fora)
+    """
+    if not patient_ids:
+        return {}
+
+    return {
+        row[0]: Recipient(*row)
+        for row in _query(user_id).filter(Patient.id.in_(patient_ids))
+    }
+
+
+def load_recipient(user_id, patient_id):
+    """Carrega um destinatário (uma consulta com o profissional junto); None se não existir"""
+    row = _query(user_id).filter(Patient.id == patient_id).first()
+    return Recipient(*row) if row else None
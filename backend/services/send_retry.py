@@ -0,0 +1,128 @@
+import os
+import json
+import random
+from datetime import datetime, timedelta
+import requests
+
+# Tentativas de envio (incluindo a primeira) antes de ir para a dead-letter
+RETRY_MAX_ATTEMPTS = int(os.getenv('WHATSAPP_RETRY_MAX_ATTEMPTS', 5))
+
+# Backoff exponencial: base * 2^(tentativa - 1), limitado ao máximo (segundos)
+RETRY_BASE_DELAY = float(os.getenv('WHATSAPP_RETRY_BASE_DELAY', 30))
+RETRY_MAX_DELAY = float(os.getenv('WHATSAPP_RETRY_MAX_DELAY', 3600))
+
+# Lista com os envios que esgotaram as tentativas
+DEAD_LETTER_KEY = 'dead_letter:whatsapp'
+
+
+def is_transient_failure(status_code=None, error=None):
+    """
+    Indica se vale tentar o envio de novo
+
+    Limite de taxa (429), erros 5xx da API e falhas de rede/timeout são
+    transitórios; os demais erros 4xx (número inválido, token, payload)
+    falhariam de novo.
+    """
+    if error is not None:
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+def retry_delay(attempt):
+    """
+    Espera antes da tentativa seguinte à `attempt` (1 = primeira tentativa)
+
+    O jitter sorteia a espera entre a base e o teto exponencial, para que
+    envios que falharam juntos não voltem todos no mesmo instante.
+    """
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return timedelta(seconds=random.uniform(min(RETRY_BASE_DELAY, ceiling), ceiling))
+
+
+def schedule_retry(message, attempt, status_code=None, error=None):
+    """
+    Reenfileira um envio na fila 'retry' ou, esgotadas as tentativas, grava na dead-letter
+
+    Args:
+        message: Dict com user_id, patient_id, message_type, content, buttons e values
+        attempt: Tentativa que acabou de falhar
+        status_code: Status HTTP da resposta, se houver
+        error: Descrição do erro
+
+    Returns:
+        bool: True se um novo envio foi agendado
+    """
+    from workers import conn, retry_queue, send_whatsapp_message
+
+    if attempt < RETRY_MAX_ATTEMPTS:
+        retry_queue.enqueue_in(retry_delay(attempt), send_whatsapp_message, attempt=attempt + 1, **message)
+        return True
+
+    entry = dict(message)
+    entry.update({
+        'attempts': attempt,
+        'status_code': status_code,
+        'error': error,
+        'failed_at': datetime.utcnow().isoformat()
+    })
+    conn.rpush(DEAD_LETTER_KEY, json.dumps(entry))
+    return False
+
+
+def list_dead_letters(start=0, count=100):
+    """Lista envios da dead-letter, do mais antigo para o mais recente"""
+    from workers import conn
+
+    return [json.loads(raw) for raw in conn.lrange(DEAD_LETTER_KEY, start, start + count - 1)]
+
+
+def count_dead_letters():
+    from workers import conn
+
+    return conn.llen(DEAD_LETTER_KEY)
+
+
+def replay_dead_letters(limit=None):
+    """
+    Reenfileira envios da dead-letter na fila 'retry', com as tentativas zeradas
+
+    Cada item é retirado da lista antes de ser reenfileirado; um envio que
+    falhar de novo volta para o fim da dead-letter.
+
+    Returns:
+        int: Quantidade de envios reenfileirados
+    """
+    from workers import conn, retry_queue, send_whatsapp_message
+
+    replayed = 0
+    while limit is None or replayed < limit:
+        raw = conn.lpop(DEAD_LETTER_KEY)
+        if raw is None:
+            break
+
+        entry = json.loads(raw)
+        retry_queue.enqueue(
+            send_whatsapp_message,
+            user_id=entry['user_id'],
+            patient_id=entry['patient_id'],
+            message_type=entry['message_type'],
+            content=entry['content'],
+            buttons=entry.get('buttons'),
+            values=entry.get('values'),
+            appointment_id=entry.get('appointment_id'),
+            attempt=1
+        )
+        replayed += 1
+
+    return replayed
+
+
+def purge_dead_letters():
+    """Remove todos os envios da dead-letter; retorna quantos foram removidos"""
+    from workers import conn
+
+    pipe = conn.pipeline()
+    pipe.llen(DEAD_LETTER_KEY)
+    pipe.delete(DEAD_LETTER_KEY)
+    return pipe.execute()[0]
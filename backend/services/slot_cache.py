@@ -0,0 +1,277 @@
+import os
+import json
+import uuid
+import threading
+import redis
+from datetime import datetime, timedelta
+from services.cache import LRUCache
+from services.slots import FreeSlot, iter_free_slots, load_slot_inputs
+
+# Valor padrão de `version` em get/set: consultar a versão atual no Redis
+_CURRENT = object()
+
+
+def week_start(day):
+    """Segunda-feira da semana de uma data (chave de cache da semana)"""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day - timedelta(days=day.weekday())
+
+
+class SlotCache:
+    """
+    Cache de slots livres por profissional e semana
+
+    Os valores são as listas de FreeSlot (UTC) de uma semana completa. O
+    backend padrão é um LRU em memória, por processo; com
+    SLOT_CACHE_BACKEND=redis o cache passa a ser compartilhado entre os
+    processos da API (um hash por profissional em REDIS_URL).
+
+    No backend em memória, cada entrada guarda a versão do profissional
+    (`slots:version:<id>` no Redis) com que foi calculada; `invalidate`
+    troca essa versão por um token novo, então escritas feitas em outro processo (ex.: um
+    cancelamento aplicado pelo worker do webhook) invalidam o cache de todos
+    os processos da API. Sem Redis, a invalidação vale só para o processo.
+    """
+
+    def __init__(self, backend=None, maxsize=None, ttl=None, connection=None):
+        self.backend = backend or os.getenv('SLOT_CACHE_BACKEND', 'memory')
+        self.ttl = ttl or int(os.getenv('SLOT_CACHE_TTL', 3600))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = LRUCache(maxsize=maxsize or int(os.getenv('SLOT_CACHE_SIZE', 2048)), ttl=self.ttl)
+        self._connection = connection
+        self._warned = False
+
+    def _conn(self):
+        # Conexão obtida no primeiro uso: importar workers durante o import
+        # deste módulo cria um ciclo (workers -> webhook_processor -> slot_cache)
+        if self._connection is None:
+            from workers import conn
+            self._connection = conn
+        return self._connection
+
+    def _key(self, user_id):
+        return f'slots:{user_id}'
+
+    def _version_key(self, user_id):
+        return f'slots:version:{user_id}'
+
+    def _warn(self, error):
+        # Avisa uma vez por processo para não poluir o log a cada leitura
+        if not self._warned:
+            print(f"Versões do cache de slots indisponíveis, invalidação apenas local: {str(error)}")
+            self._warned = True
+
+    def version(self, user_id):
+        """
+        Versão atual dos slots do profissional (backend em memória); None sem Redis
+
+        A versão é um token aleatório, criado na primeira leitura se a chave
+        não existir (ex.: Redis reiniciado): um valor nunca se repete, então
+        nenhuma entrada calculada com uma versão antiga volta a valer.
+        """
+        if self.backend == 'redis':
+            return None
+
+        try:
+            pipe = self._conn().pipeline()
+            pipe.set(self._version_key(user_id), uuid.uuid4().hex, nx=True)
+            pipe.get(self._version_key(user_id))
+            _, raw = pipe.execute()
+        except redis.exceptions.RedisError as e:
+            self._warn(e)
+            return None
+
+        return raw.decode() if isinstance(raw, bytes) else raw
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, user_id, week, version=_CURRENT):
+        """
+        Retorna a lista de slots da semana ou None se não estiver em cache
+
+        `version` (de `version()`) evita uma consulta ao Redis por semana
+        quando várias semanas do mesmo profissional são lidas em sequência.
+        """
+        if self.backend == 'redis':
+            raw = self._conn().hget(self._key(user_id), week.isoformat())
+            slots = None
+            if raw is not None:
+                slots = [
+                    FreeSlot(datetime.fromisoformat(start), datetime.fromisoformat(end), duration)
+                    for start, end, duration in json.loads(raw)
+                ]
+        else:
+            if version is _CURRENT:
+                version = self.version(user_id)
+            entry = self._memory.get((user_id, week))
+            slots = entry[1] if entry is not None and entry[0] == version else None
+
+        self._count(slots is not None)
+        return slots
+
+    def set(self, user_id, week, slots, version=_CURRENT):
+        if self.backend == 'redis':
+            key = self._key(user_id)
+            raw = json.dumps([[s.start.isoformat(), s.end.isoformat(), s.duration] for s in slots])
+            pipe = self._conn().pipeline()
+            pipe.hset(key, week.isoformat(), raw)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        else:
+            # A versão lida antes do cálculo: uma invalidação no meio do
+            # caminho torna a entrada obsoleta já na próxima leitura
+            if version is _CURRENT:
+                version = self.version(user_id)
+            self._memory.set((user_id, week), (version, list(slots)))
+
+    def invalidate(self, user_id, days=None):
+        """
+        Invalida as semanas afetadas por uma escrita
+
+        Args:
+            user_id: ID do profissional
+            days: Datas (ou datetimes) alteradas; None invalida todas as semanas
+        """
+        if self.backend != 'redis':
+            self._bump_version(user_id)
+
+        if days is None:
+            if self.backend == 'redis':
+                self._conn().delete(self._key(user_id))
+            else:
+                self._memory.delete_where(lambda key: key[0] == user_id)
+            return
+
+        weeks = {week_start(day) for day in days if day is not None}
+
+        if self.backend == 'redis':
+            if weeks:
+                self._conn().hdel(self._key(user_id), *[w.isoformat() for w in weeks])
+        else:
+            for week in weeks:
+                self._memory.delete((user_id, week))
+
+    def _bump_version(self, user_id):
+        # Invalida o profissional nos demais processos com um token novo
+        try:
+            self._conn().set(self._version_key(user_id), uuid.uuid4().hex)
+        except redis.exceptions.RedisError as e:
+            self._warn(e)
+
+    def stats(self):
+        return {
+            'backend': self.backend,
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._memory) if self.backend != 'redis' else None
+        }
+
+
+def cached_free_slots(user_id, first_day, last_day, not_before=None, cache=None, limit=None):
+    """
+    Gera os slots livres do período usando o cache semanal
+
+    Sem `limit`, semanas ausentes consecutivas são carregadas juntas (uma
+    consulta por tabela para o bloco), calculadas por completo e gravadas no
+    cache. Com `limit` (modo "próximos N"), as semanas ausentes são
+    preenchidas uma a uma e a geração para assim que o limite é atingido,
+    sem carregar as semanas seguintes.
+
+    Args:
+        user_id: ID do profissional
+        first_day: Primeiro dia (date)
+        last_day: Último dia (date), inclusive
+        not_before: Descartar slots que começam antes deste datetime UTC (opcional)
+        cache: Instância de SlotCache (padrão: slot_cache)
+        limit: Quantidade máxima de slots (opcional)
+
+    Yields:
+        FreeSlot: Slots livres em ordem cronológica
+    """
+    cache = cache or slot_cache
+
+    weeks = []
+    week = week_start(first_day)
+    while week <= last_day:
+        weeks.append(week)
+        week += timedelta(weeks=1)
+
+    fetched = {}
+    version = cache.version(user_id)
+
+    def lookup(w):
+        if w not in fetched:
+            fetched[w] = cache.get(user_id, w, version)
+        return fetched[w]
+
+    remaining = limit
+    i = 0
+    while i < len(weeks):
+        slots = lookup(weeks[i])
+
+        if slots is None:
+            # Bloco de semanas ausentes consecutivas (só a atual com limite)
+            missing = [weeks[i]]
+            while limit is None and i + len(missing) < len(weeks) and lookup(weeks[i + len(missing)]) is None:
+                missing.append(weeks[i + len(missing)])
+
+            block_first = missing[0]
+            block_last = missing[-1] + timedelta(days=6)
+            availability, bookings, blackout_dates = load_slot_inputs(user_id, block_first, block_last)
+
+            by_week = {w: [] for w in missing}
+            for slot in iter_free_slots(block_first, block_last, availability, bookings, blackout_dates):
+                by_week[week_start(slot.start)].append(slot)
+
+            for w in missing:
+                cache.set(user_id, w, by_week[w], version)
+
+            slots = [slot for w in missing for slot in by_week[w]]
+            i += len(missing)
+        else:
+            i += 1
+
+        for slot in slots:
+            day = slot.start.date()
+            if day < first_day or day > last_day:
+                continue
+            if not_before is not None and slot.start < not_before:
+                continue
+            yield slot
+
+            if remaining is not None:
+                remaining -= 1
+                if remaining <= 0:
+                    return
+
+
+def next_free_slots(user_id, limit, weeks=4, now=None):
+    """
+    Retorna os próximos N slots livres a partir de agora (ex.: {slots} da oferta)
+
+    Args:
+        user_id: ID do profissional
+        limit: Quantidade máxima de slots
+        weeks: Horizonte de busca em semanas
+        now: Datetime UTC de referência (padrão: agora)
+
+    Returns:
+        list: Até `limit` FreeSlot
+    """
+    now = now or datetime.utcnow()
+    first_day = now.date()
+    last_day = first_day + timedelta(weeks=weeks) - timedelta(days=1)
+
+    return list(cached_free_slots(user_id, first_day, last_day, not_before=now, limit=limit))
+
+
+# Instância global do cache
+slot_cache = SlotCache()
@@ -0,0 +1,177 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+import heapq
+import pytz
+from models import Availability, Blackout, Appointment
+
+# Slot livre em UTC (datetimes "naive", como armazenados no banco)
+FreeSlot = namedtuple('FreeSlot', ['start', 'end', 'duration'])
+
+
+def merge_busy_intervals(intervals):
+    """
+    Ordena e funde intervalos ocupados sobrepostos ou adjacentes
+
+    Args:
+        intervals: Iterável de tuplas (inicio, fim)
+
+    Returns:
+        list: Intervalos disjuntos ordenados por início
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _window_candidates(day, avail):
+    """Gera os slots candidatos (ordenados) de uma janela de disponibilidade"""
+    slot_duration = timedelta(minutes=avail.duration_min)
+    step = slot_duration + timedelta(minutes=avail.break_min or 0)
+
+    current = datetime.combine(day, avail.start_time)
+    end_dt = datetime.combine(day, avail.end_time)
+
+    while current + slot_duration <= end_dt:
+        yield (current, current + slot_duration, avail.duration_min)
+        current += step
+
+
+def iter_free_slots(first_day, last_day, availability, bookings, blackout_dates=()):
+    """
+    Gera os slots livres entre first_day e last_day (inclusive) em uma
+    única varredura linear
+
+    Os candidatos de cada dia (de todas as janelas de disponibilidade) são
+    intercalados em ordem de início e comparados com os agendamentos já
+    fundidos em intervalos disjuntos, avançando um único ponteiro.
+
+    Args:
+        first_day: Primeiro dia (date)
+        last_day: Último dia (date), inclusive
+        availability: Objetos com weekday, start_time, end_time, duration_min e break_min
+        bookings: Iterável de tuplas (inicio, fim) em UTC
+        blackout_dates: Conjunto de datas bloqueadas
+
+    Yields:
+        FreeSlot: Slots livres em ordem cronológica
+    """
+    # Agrupar janelas por dia da semana (0=Segunda)
+    windows_by_weekday = {}
+    for avail in availability:
+        windows_by_weekday.setdefault(avail.weekday, []).append(avail)
+
+    busy = merge_busy_intervals(bookings)
+    busy_count = len(busy)
+    blackout_dates = set(blackout_dates)
+    i = 0
+
+    current_date = first_day
+    while current_date <= last_day:
+        windows = windows_by_weekday.get(current_date.weekday())
+
+        if windows and current_date not in blackout_dates:
+            candidates = heapq.merge(*[_window_candidates(current_date, a) for a in windows])
+
+            for slot_start, slot_end, duration in candidates:
+                # Descartar intervalos ocupados que terminam antes do slot
+                while i < busy_count and busy[i][1] <= slot_start:
+                    i += 1
+
+                if i < busy_count and busy[i][0] < slot_end:
+                    continue
+
+                yield FreeSlot(slot_start, slot_end, duration)
+
+        current_date += timedelta(days=1)
+
+
+def load_slot_inputs(user_id, first_day, last_day):
+    """
+    Carrega disponibilidade, bloqueios e agendamentos do período com uma
+    consulta limitada por tabela
+
+    Args:
+        user_id: ID do profissional
+        first_day: Primeiro dia (date)
+        last_day: Último dia (date), inclusive
+
+    Returns:
+        tuple: (disponibilidades, intervalos ocupados, datas bloqueadas)
+    """
+    availability = Availability.query.filter_by(
+        user_id=user_id,
+        active=True
+    ).all()
+
+    blackouts = Blackout.query.with_entities(Blackout.date).filter(
+        Blackout.user_id == user_id,
+        Blackout.date >= first_day,
+        Blackout.date <= last_day
+    ).all()
+
+    appointments = Appointment.query.with_entities(
+        Appointment.start_datetime,
+        Appointment.end_datetime
+    ).filter(
+        Appointment.user_id == user_id,
+        Appointment.start_datetime >= datetime.combine(first_day, datetime.min.time()),
+        Appointment.start_datetime <= datetime.combine(last_day, datetime.max.time()),
+        Appointment.status.in_(['scheduled', 'confirmed'])
+    ).all()
+
+    bookings = [(start, end) for start, end in appointments]
+    blackout_dates = {row.date for row in blackouts}
+
+    return availability, bookings, blackout_dates
+
+
+def format_slots(slots, timezone):
+    """
+    Serializa slots livres no formato da API, convertendo para o timezone do usuário
+
+    O deslocamento UTC é calculado uma vez por dia; a conversão slot a slot
+    só é usada em dias com mudança de horário de verão.
+
+    Args:
+        slots: Iterável de FreeSlot
+        timezone: Nome do timezone ou objeto pytz
+
+    Returns:
+        list: Lista de dicts com date, start, end e duration
+    """
+    if isinstance(timezone, str):
+        timezone = pytz.timezone(timezone)
+
+    result = []
+    offsets = {}
+
+    for slot in slots:
+        day = slot.start.date()
+
+        if day not in offsets:
+            day_start = datetime.combine(day, datetime.min.time())
+            first = pytz.utc.localize(day_start).astimezone(timezone).utcoffset()
+            last = pytz.utc.localize(day_start + timedelta(days=1)).astimezone(timezone).utcoffset()
+            offsets[day] = first if first == last else None
+
+        offset = offsets[day]
+        if offset is not None:
+            start_local = slot.start + offset
+            end_local = slot.end + offset
+        else:
+            start_local = pytz.utc.localize(slot.start).astimezone(timezone)
+            end_local = pytz.utc.localize(slot.end).astimezone(timezone)
+
+        result.append({
+            'date': day.isoformat(),
+            'start': f'{start_local.hour:02d}:{start_local.minute:02d}',
+            'end': f'{end_local.hour:02d}:{end_local.minute:02d}',
+            'duration': slot.duration
+        })
+
+    return result
@@ -0,0 +1,100 @@
+import re
+import json
+from services.cache import LRUCache
+
+# Placeholders aceitos nos templates de mensagem (ver defaults em routes/automation.py)
+PLACEHOLDERS = frozenset(['Profissional', 'Paciente', 'quando', 'slots', 'dia', 'hora', 'modo', 'janela'])
+
+_PLACEHOLDER_RE = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+# Templates compilados, por (id, versão) ou pelo texto
+_compiled_cache = LRUCache(maxsize=1024)
+
+
+class UnknownPlaceholderError(ValueError):
+    """Template com placeholders fora de PLACEHOLDERS"""
+
+    def __init__(self, placeholders):
+        self.placeholders = sorted(placeholders)
+        super().__init__(f"Placeholders desconhecidos: {', '.join('{' + p + '}' for p in self.placeholders)}")
+
+
+class _Values(dict):
+    # Placeholder sem valor permanece no texto, como no str.replace
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+class CompiledTemplate:
+    """
+    Template de mensagem analisado uma única vez
+
+    O texto é convertido em uma string de formatação (chaves literais
+    escapadas) e renderizado com str.format_map, sem uma passada de
+    str.replace por placeholder.
+    """
+
+    __slots__ = ('content', 'buttons', 'placeholders', '_format')
+
+    def __init__(self, content, buttons=None):
+        self.content = content or ''
+        self.buttons = list(buttons or [])
+
+        parts = _PLACEHOLDER_RE.split(self.content)
+        # Posições pares são texto literal, ímpares são nomes de placeholders
+        self.placeholders = frozenset(parts[1::2])
+        self._format = ''.join(
+            '{' + part + '}' if i % 2 else part.replace('{', '{{').replace('}', '}}')
+            for i, part in enumerate(parts)
+        )
+
+    def render(self, values):
+        """Renderiza o texto com um dict placeholder -> valor"""
+        return self._format.format_map(_Values(values))
+
+    def render_batch(self, values_list):
+        """Renderiza o texto para vários destinatários em uma chamada"""
+        template_format = self._format
+        return [template_format.format_map(_Values(values)) for values in values_list]
+
+
+def validate_template(content):
+    """Levanta UnknownPlaceholderError se o texto usar placeholders desconhecidos"""
+    unknown = set(_PLACEHOLDER_RE.findall(content or '')) - PLACEHOLDERS
+    if unknown:
+        raise UnknownPlaceholderError(unknown)
+
+
+def get_compiled_template(template_id, content_json):
+    """
+    Retorna o template compilado de um MessageTemplate
+
+    O cache é indexado por id e versão (o próprio content_json salvo), então
+    um template editado é recompilado no primeiro uso seguinte, sem
+    invalidação explícita, e o JSON é lido uma vez por versão.
+
+    Args:
+        template_id: ID do MessageTemplate
+        content_json: content_json salvo ({"content": ..., "buttons": [...]})
+    """
+    key = (template_id, content_json)
+    compiled = _compiled_cache.get(key)
+
+    if compiled is None:
+        data = json.loads(content_json) if content_json else {}
+        compiled = CompiledTemplate(data.get('content', ''), data.get('buttons', []))
+        _compiled_cache.set(key, compiled)
+
+    return compiled
+
+
+def compile_text(content):
+    """Retorna o texto compilado (cache pelo próprio texto), para jobs que recebem só o conteúdo"""
+    key = ('text', content)
+    compiled = _compiled_cache.get(key)
+
+    if compiled is None:
+        compiled = CompiledTemplate(content)
+        _compiled_cache.set(key, compiled)
+
+    return compiled
@@ -0,0 +1,124 @@
+import os
+import time
+import redis
+from services.cache import LRUCache
+
+# Por quanto tempo um message.id processado é lembrado (a Meta reenvia por dias)
+DEDUP_TTL = int(os.getenv('WEBHOOK_DEDUP_TTL', 7 * 24 * 3600))
+
+# Limite de ids guardados no Redis e no cache local
+DEDUP_MAX_IDS = int(os.getenv('WEBHOOK_DEDUP_MAX_IDS', 200000))
+DEDUP_LOCAL_SIZE = int(os.getenv('WEBHOOK_DEDUP_LOCAL_SIZE', 10000))
+
+SEEN_KEY = 'webhook:seen'
+DUPLICATES_KEY = 'webhook:duplicates'
+
+
+class WebhookDeduplicator:
+    """
+    Descarta mensagens de webhook já processadas, pelo message.id do WhatsApp
+
+    Os ids ficam em um conjunto ordenado no Redis (membro -> momento do
+    registro), aparado por idade e por tamanho a cada lote; um LRU local na
+    frente evita a ida ao Redis para reenvios recentes. O registro é feito
+    com ZADD NX, então só um worker processa cada id. Se o Redis estiver
+    indisponível, vale apenas o cache local.
+    """
+
+    def __init__(self, connection=None, ttl=DEDUP_TTL, max_ids=DEDUP_MAX_IDS, local_size=DEDUP_LOCAL_SIZE):
+        self.ttl = ttl
+        self.max_ids = max_ids
+        self.duplicates = 0
+        self._connection = connection
+        self._local = LRUCache(maxsize=local_size, ttl=ttl)
+
+    def _conn(self):
+        if self._connection is None:
+            from workers import conn
+            self._connection = conn
+        return self._connection
+
+    def claim(self, messages):
+        """
+        Registra os ids das mensagens e retorna apenas as ainda não processadas
+
+        Mensagens sem id são sempre processadas; ids repetidos dentro do
+        próprio lote contam como duplicados.
+        """
+        fresh = []
+        candidates = []
+        seen_in_batch = set()
+        duplicates = 0
+
+        for message in messages:
+            message_id = message.get('id')
+            if not message_id:
+                fresh.append(message)
+            elif message_id in seen_in_batch or self._local.get(message_id):
+                duplicates += 1
+            else:
+                seen_in_batch.add(message_id)
+                candidates.append(message)
+
+        if candidates:
+            now = time.time()
+            try:
+                pipe = self._conn().pipeline()
+                for message in candidates:
+                    pipe.zadd(SEEN_KEY, {message['id']: now}, nx=True)
+                pipe.zremrangebyscore(SEEN_KEY, '-inf', now - self.ttl)
+                pipe.zremrangebyrank(SEEN_KEY, 0, -self.max_ids - 1)
+                added = pipe.execute()[:len(candidates)]
+            except redis.exceptions.RedisError as e:
+                print(f"Deduplicação no Redis indisponível, usando apenas o cache local: {str(e)}")
+                added = [1] * len(candidates)
+
+            for message, is_new in zip(candidates, added):
+                self._local.set(message['id'], True)
+                if is_new:
+                    fresh.append(message)
+                else:
+                    duplicates += 1
+
+        if duplicates:
+            self._count(duplicates)
+
+        return fresh
+
+    def release(self, messages):
+        """Esquece os ids de mensagens cujo processamento falhou, para aceitar o reenvio"""
+        ids = [message['id'] for message in messages if message.get('id')]
+        if not ids:
+            return
+
+        for message_id in ids:
+            self._local.delete(message_id)
+
+        try:
+            self._conn().zrem(SEEN_KEY, *ids)
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao liberar ids de webhook: {str(e)}")
+
+    def _count(self, duplicates):
+        self.duplicates += duplicates
+        try:
+            self._conn().incrby(DUPLICATES_KEY, duplicates)
+        except redis.exceptions.RedisError:
+            pass
+
+    def stats(self):
+        """Duplicados descartados (total no Redis, de todos os workers) e uso do cache local"""
+        try:
+            total = int(self._conn().get(DUPLICATES_KEY) or 0)
+        except redis.exceptions.RedisError:
+            total = None
+
+        return {
+            'duplicates_total': total,
+            'duplicates_process': self.duplicates,
+            'local_cache': self._local.stats()
+        }
+
+
+# Instância global do deduplicador
+webhook_dedup = WebhookDeduplicator()
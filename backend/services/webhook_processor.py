@@ -0,0 +1,479 @@
+import os
+import json
+import time
+import hashlib
+from datetime import datetime, timedelta
+import redis
+from sqlalchemy import insert
+from models import Patient, Appointment, MessageLog, db
+from services.slot_cache import slot_cache
+from services.webhook_dedup import webhook_dedup
+from services.whatsapp_client import appointment_id_from_reply
+from services.message_status import (
+    iter_statuses, apply_status_updates, take_pending_statuses, park_pending_statuses
+)
+
+# Lista com os corpos brutos recebidos em /webhooks/whatsapp
+WEBHOOK_QUEUE_KEY = 'webhook:whatsapp'
+
+# Corpos retirados da fila e ainda não confirmados (commit); voltam para a
+# fila no próximo dreno se o worker morrer no meio de um lote
+WEBHOOK_PROCESSING_KEY = 'webhook:whatsapp:processing'
+
+# Tentativas por corpo (hash sha1 -> falhas) e corpos que esgotaram as tentativas
+WEBHOOK_ATTEMPTS_KEY = 'webhook:whatsapp:attempts'
+WEBHOOK_DEAD_LETTER_KEY = 'webhook:whatsapp:dead'
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 5))
+
+# Espera antes de drenar de novo quando nenhum corpo do lote pôde ser aplicado
+# (ex.: banco fora do ar), em segundos
+WEBHOOK_RETRY_DELAY = int(os.getenv('WEBHOOK_RETRY_DELAY', 30))
+
+# Marca de que há um job drenando a lista (expira se o worker morrer)
+DRAIN_LOCK_KEY = 'webhook:whatsapp:draining'
+DRAIN_LOCK_SECONDS = 300
+
+# Corpos processados por lote
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 100))
+
+# Move atomicamente até N corpos do início da fila para a lista em processamento
+_POP_BATCH_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+# Devolve ao início da fila, na ordem original, os corpos de um dreno interrompido
+_REQUEUE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+for i = #items, 1, -1 do
+    redis.call('LPUSH', KEYS[2], items[i])
+end
+redis.call('DEL', KEYS[1])
+return #items
+"""
+
+
+def is_valid_payload(data):
+    """Confere a estrutura mínima de uma notificação da WhatsApp Cloud API"""
+    return isinstance(data, dict) and isinstance(data.get('entry'), list)
+
+
+def enqueue_webhook(raw_body):
+    """
+    Grava o corpo bruto na fila do Redis e garante um job drenando a fila
+
+    O RPUSH e a marca do dreno vão em uma única transação; o job
+    process_webhook_events só é enfileirado quando nenhum outro está ativo.
+    Levanta RedisError apenas se o corpo não foi gravado: uma falha ao
+    enfileirar o job libera a marca, e o próximo webhook tenta de novo.
+    """
+    from workers import conn, high_queue, process_webhook_events
+
+    pipe = conn.pipeline()
+    pipe.rpush(WEBHOOK_QUEUE_KEY, raw_body)
+    pipe.set(DRAIN_LOCK_KEY, 1, nx=True, ex=DRAIN_LOCK_SECONDS)
+    _, acquired = pipe.execute()
+
+    if acquired:
+        try:
+            high_queue.enqueue(process_webhook_events)
+        except redis.exceptions.RedisError as e:
+            print(f"Erro ao enfileirar o dreno de webhooks (o corpo ficou na fila): {str(e)}")
+            try:
+                conn.delete(DRAIN_LOCK_KEY)
+            except redis.exceptions.RedisError:
+                pass
+
+
+def pop_webhook_batch(connection, size=WEBHOOK_BATCH_SIZE):
+    """Move atomicamente até `size` corpos do início da fila para a lista em processamento"""
+    return connection.eval(_POP_BATCH_SCRIPT, 2, WEBHOOK_QUEUE_KEY, WEBHOOK_PROCESSING_KEY, size)
+
+
+def requeue_in_flight(connection):
+    """Devolve à fila os corpos que ficaram em processamento (worker interrompido)"""
+    return connection.eval(_REQUEUE_SCRIPT, 2, WEBHOOK_PROCESSING_KEY, WEBHOOK_QUEUE_KEY)
+
+
+def _body_hash(raw_body):
+    return hashlib.sha1(raw_body if isinstance(raw_body, bytes) else raw_body.encode()).hexdigest()
+
+
+def finish_webhook_batch(connection, raw_bodies, failed):
+    """
+    Tira o lote da lista em processamento depois do commit
+
+    Corpos que falharam voltam para o fim da fila até WEBHOOK_MAX_ATTEMPTS
+    falhas; depois disso vão para a dead-letter de webhooks.
+
+    Args:
+        raw_bodies: Corpos do lote
+        failed: Dict corpo -> mensagem de erro
+    """
+    attempts = {}
+    if failed:
+        pipe = connection.pipeline()
+        for raw_body in failed:
+            pipe.hincrby(WEBHOOK_ATTEMPTS_KEY, _body_hash(raw_body), 1)
+        pipe.expire(WEBHOOK_ATTEMPTS_KEY, 24 * 60 * 60)
+        attempts = dict(zip(failed, pipe.execute()))
+
+    pipe = connection.pipeline()
+    for raw_body in raw_bodies:
+        pipe.lrem(WEBHOOK_PROCESSING_KEY, 1, raw_body)
+
+        if raw_body not in failed:
+            continue
+
+        if attempts[raw_body] < WEBHOOK_MAX_ATTEMPTS:
+            pipe.rpush(WEBHOOK_QUEUE_KEY, raw_body)
+        else:
+            pipe.hdel(WEBHOOK_ATTEMPTS_KEY, _body_hash(raw_body))
+            pipe.rpush(WEBHOOK_DEAD_LETTER_KEY, json.dumps({
+                'body': raw_body.decode() if isinstance(raw_body, bytes) else raw_body,
+                'attempts': attempts[raw_body],
+                'error': failed[raw_body],
+                'failed_at': datetime.utcnow().isoformat()
+            }))
+    pipe.execute()
+
+
+def drain_webhook_queue(connection, size=WEBHOOK_BATCH_SIZE):
+    """
+    Processa a fila em lotes até esvaziá-la (precisa de app context)
+
+    Cada lote fica na lista em processamento até o commit, então um worker
+    interrompido não perde eventos: o próximo dreno os devolve à fila. Se
+    nenhum corpo de um lote puder ser aplicado (ex.: banco fora do ar), o
+    dreno para e é reagendado para daqui a WEBHOOK_RETRY_DELAY segundos,
+    mantendo a marca do dreno. Ao terminar, libera a marca e confere a fila
+    mais uma vez, para que um corpo gravado entre o último lote e a
+    liberação não fique parado.
+
+    Returns:
+        int: Quantidade de corpos processados
+    """
+    from workers import retry_queue, process_webhook_events
+
+    requeue_in_flight(connection)
+    processed = 0
+
+    while True:
+        raw_bodies = pop_webhook_batch(connection, size)
+
+        if not raw_bodies:
+            connection.delete(DRAIN_LOCK_KEY)
+            if connection.llen(WEBHOOK_QUEUE_KEY) == 0:
+                return processed
+            if not connection.set(DRAIN_LOCK_KEY, 1, nx=True, ex=DRAIN_LOCK_SECONDS):
+                # Outro job assumiu o dreno
+                return processed
+            continue
+
+        connection.expire(DRAIN_LOCK_KEY, DRAIN_LOCK_SECONDS)
+        _, failed = process_batch(raw_bodies)
+        finish_webhook_batch(connection, raw_bodies, failed)
+        processed += len(raw_bodies) - len(failed)
+
+        if failed and len(failed) == len(raw_bodies):
+            connection.expire(DRAIN_LOCK_KEY, DRAIN_LOCK_SECONDS)
+            retry_queue.enqueue_in(timedelta(seconds=WEBHOOK_RETRY_DELAY), process_webhook_events)
+            return processed
+
+
+def process_batch(raw_bodies):
+    """
+    Processa um lote de corpos brutos em uma única transação
+
+    Se o lote falhar, cada corpo é reprocessado sozinho, para que um evento
+    problemático não descarte os demais.
+
+    Returns:
+        tuple: (mensagens aplicadas, dict corpo -> erro dos corpos não aplicados)
+    """
+    payloads = []
+    failed = {}
+    for raw_body in raw_bodies:
+        try:
+            payloads.append((raw_body, json.loads(raw_body)))
+        except ValueError as e:
+            print(f"Webhook do WhatsApp com JSON inválido: {str(e)}")
+            failed[raw_body] = f'JSON inválido: {str(e)}'
+
+    if not payloads:
+        return 0, failed
+
+    try:
+        return process_payloads([payload for _, payload in payloads]), failed
+    except Exception as e:
+        db.session.rollback()
+        if len(payloads) == 1:
+            print(f"Erro ao processar webhook do WhatsApp: {str(e)}")
+            failed[payloads[0][0]] = str(e)
+            return 0, failed
+
+    applied = 0
+    for raw_body, _ in payloads:
+        body_applied, body_failed = process_batch([raw_body])
+        applied += body_applied
+        failed.update(body_failed)
+
+    return applied, failed
+
+
+def count_failed_webhooks(connection):
+    """Quantidade de corpos na dead-letter de webhooks"""
+    return connection.llen(WEBHOOK_DEAD_LETTER_KEY)
+
+
+def list_failed_webhooks(connection, start=0, count=20):
+    """Entradas da dead-letter de webhooks (dicts com body, attempts, error e failed_at)"""
+    return [json.loads(raw) for raw in connection.lrange(WEBHOOK_DEAD_LETTER_KEY, start, start + count - 1)]
+
+
+def replay_failed_webhooks(connection, limit=None):
+    """Devolve corpos da dead-letter à fila de webhooks; retorna quantos foram devolvidos"""
+    replayed = 0
+    while limit is None or replayed < limit:
+        raw = connection.lpop(WEBHOOK_DEAD_LETTER_KEY)
+        if raw is None:
+            break
+        enqueue_webhook(json.loads(raw)['body'])
+        replayed += 1
+
+    return replayed
+
+
+def purge_failed_webhooks(connection):
+    """Remove todos os corpos da dead-letter de webhooks; retorna quantos foram removidos"""
+    pipe = connection.pipeline()
+    pipe.llen(WEBHOOK_DEAD_LETTER_KEY)
+    pipe.delete(WEBHOOK_DEAD_LETTER_KEY)
+    count, _ = pipe.execute()
+    return count
+
+
+def iter_messages(payloads):
+    """Mensagens recebidas, na ordem de chegada, de uma lista de notificações"""
+    for data in payloads:
+        for entry in data.get('entry', []):
+            for change in entry.get('changes', []):
+                value = change.get('value', {})
+
+                # Verificar se é uma mensagem
+                for message in value.get('messages', []):
+                    yield message
+
+
+def process_payloads(payloads):
+    """
+    Aplica as mensagens e callbacks de status de várias notificações com poucas idas ao banco
+
+    Os remetentes são resolvidos com uma consulta IN e os agendamentos
+    ativos desses pacientes com outra; as mudanças de status e os logs são
+    aplicados em memória, na ordem das mensagens, e gravados em um único
+    commit junto com os callbacks de status (delivered, read, failed) dos
+    logs enviados. Caches e agenda de lembretes são atualizados depois do
+    commit. Mensagens já processadas (mesmo message.id) são descartadas
+    antes; se o commit falhar, os ids são liberados para que o reenvio seja
+    aceito.
+
+    Returns:
+        int: Quantidade de mensagens aplicadas e de logs com status atualizado
+    """
+    from workers import conn
+
+    messages = [message for message in iter_messages(payloads) if message.get('from')]
+
+    # Reenvios da Meta (mesmo message.id) são descartados antes de tocar no banco
+    messages = webhook_dedup.claim(messages)
+
+    # Callbacks deste lote e os que aguardavam o log ser gravado
+    now = time.time()
+    pending = take_pending_statuses(conn)
+    first_seen = {(wamid, status): seen_at for wamid, status, seen_at in pending}
+    statuses = [(wamid, status) for wamid, status, _ in pending] + list(iter_statuses(payloads))
+
+    if not messages and not statuses:
+        return 0
+
+    try:
+        applied, changed = _apply_messages(messages) if messages else (0, [])
+        updated, unmatched = apply_status_updates(statuses)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        webhook_dedup.release(messages)
+        park_pending_statuses(conn, pending)
+        raise
+
+    park_pending_statuses(conn, [
+        (wamid, status, first_seen.get((wamid, status), now)) for wamid, status in unmatched
+    ])
+
+    for appointment in changed:
+        _after_status_change(appointment)
+
+    return applied + updated
+
+
+def _apply_messages(messages):
+    """Aplica as mensagens na sessão, sem commit; retorna (aplicadas, agendamentos confirmados ou cancelados)"""
+    # Encontrar os pacientes pelo número de WhatsApp (o de menor id, se repetido)
+    patients = {}
+    for patient in Patient.query.filter(
+        Patient.whatsapp.in_({message['from'] for message in messages})
+    ).order_by(Patient.id):
+        patients.setdefault(patient.whatsapp, patient)
+
+    # Agendamentos ativos dos pacientes que responderam com botões
+    button_patient_ids = {
+        patients[message['from']].id for message in messages
+        if message['from'] in patients and message.get('type') == 'interactive'
+    }
+    appointments = {}
+    if button_patient_ids:
+        for appointment in Appointment.query.filter(
+            Appointment.patient_id.in_(button_patient_ids),
+            Appointment.status.in_(['scheduled', 'confirmed'])
+        ).order_by(Appointment.patient_id, Appointment.start_datetime):
+            appointments.setdefault(appointment.patient_id, []).append(appointment)
+
+    logs = []
+    changed = []
+    applied = 0
+
+    for message in messages:
+        patient = patients.get(message['from'])
+        if not patient:
+            continue
+
+        if _apply_message(patient, message, appointments.get(patient.id, []), logs, changed):
+            applied += 1
+
+    if logs:
+        db.session.execute(insert(MessageLog), logs)
+
+    return applied, changed
+
+
+def _apply_message(patient, message, appointments, logs, changed):
+    """Aplica uma mensagem (texto ou resposta de botão) ao paciente remetente"""
+    # Processar mensagem de texto
+    if message.get('type') == 'text':
+        text = message.get('text', {}).get('body', '').lower()
+
+        # Verificar se é um opt-out ("parar")
+        if text == 'parar':
+            patient.status = 'optout'
+            logs.append(_response_log(patient, 'optout', {'text': text}))
+            return True
+
+    # Processar interações com botões
+    elif message.get('type') == 'interactive':
+        interactive = message.get('interactive', {})
+
+        if interactive.get('type') == 'button_reply':
+            button_reply = interactive.get('button_reply', {})
+            return _apply_button(
+                patient, button_reply.get('title'), appointments, logs, changed,
+                appointment_id=appointment_id_from_reply(button_reply.get('id'))
+            )
+
+    return False
+
+
+def _apply_button(patient, button_text, appointments, logs, changed, appointment_id=None):
+    """
+    Processa resposta com base no botão
+
+    Convites e lembretes levam no ID do botão o agendamento a que se referem
+    (`appointment_id`); sem ele (mensagens antigas), vale o próximo
+    agendamento do paciente.
+    """
+    if button_text == 'Confirmar':
+        # Agendamento da mensagem (ou o próximo) ainda não confirmado
+        appointment = _next_appointment(appointments, ('scheduled',), appointment_id)
+
+        if appointment:
+            appointment.status = 'confirmed'
+            changed.append(appointment)
+            logs.append(_response_log(patient, 'confirmation', {'button': button_text}))
+            return True
+
+    elif button_text == 'Remarcar':
+        appointment = _next_appointment(appointments, ('scheduled', 'confirmed'), appointment_id)
+
+        if appointment:
+            # Marcar para reagendamento (será processado pelo worker)
+            logs.append(_response_log(patient, 'reschedule_request', {
+                'button': button_text,
+                'appointment_id': appointment.id
+            }))
+            return True
+
+    elif button_text == 'Pausar':
+        # Pausar notificações para o paciente
+        patient.status = 'paused'
+        logs.append(_response_log(patient, 'pause', {'button': button_text}))
+        return True
+
+    elif button_text == 'Cancelar':
+        appointment = _next_appointment(appointments, ('scheduled', 'confirmed'), appointment_id)
+
+        if appointment:
+            appointment.status = 'cancelled'
+            changed.append(appointment)
+            logs.append(_response_log(patient, 'cancellation', {
+                'button': button_text,
+                'appointment_id': appointment.id
+            }))
+            return True
+
+    return False
+
+
+def _next_appointment(appointments, statuses, appointment_id=None):
+    # Lista já ordenada por início; o status reflete mensagens anteriores do lote.
+    # Com appointment_id, só o agendamento indicado serve (nunca outro do paciente)
+    for appointment in appointments:
+        if appointment_id is not None and appointment.id != appointment_id:
+            continue
+        if appointment.status in statuses:
+            return appointment
+    return None
+
+
+def _response_log(patient, log_type, payload):
+    """Linha de MessageLog para a resposta do paciente"""
+    return {
+        'user_id': patient.user_id,
+        'patient_id': patient.id,
+        'type': log_type,
+        'payload_json': json.dumps(payload),
+        'status': 'responded',
+        'timestamp': datetime.utcnow()
+    }
+
+
+def _after_status_change(appointment):
+    """
+    Efeitos de uma confirmação ou cancelamento, após o commit
+
+    O cancelamento libera o horário no cache de slots; em ambos os casos os
+    lembretes são reagendados (o job só envia para sessões confirmadas, então
+    uma confirmação após o vencimento do lembrete o agenda de novo enquanto
+    a janela de envio estiver aberta).
+    """
+    from scheduler import schedule_reminders
+
+    if appointment.status == 'cancelled':
+        slot_cache.invalidate(
+            appointment.user_id,
+            [appointment.start_datetime, appointment.end_datetime]
+        )
+    schedule_reminders(appointment)
@@ -1,8 +1,6 @@
 import os
-import requests
-import json
-from datetime import datetime
-from models import MessageLog, db
+from services.message_log_writer import message_log_writer
+from services.whatsapp_client import get_whatsapp_client, build_message_payload, message_id_from_response
 
 class WhatsAppService:
     """Serviço para integração com a API do WhatsApp"""
@@ -41,56 +39,10 @@ class WhatsAppService:
         # Preparar payload
         url = f"{self.api_url}/{self.phone_number_id}/messages"
         
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        
-        if buttons and len(buttons) > 0:
-            # Mensagem interativa com botões
-            button_objects = []
-            for i, button_text in enumerate(buttons):
-                button_objects.append({
-                    "type": "reply",
-                    "reply": {
-                        "id": f"btn_{i}",
-                        "title": button_text
-                    }
-                })
-            
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": to_number,
-                "type": "interactive",
-                "interactive": {
-                    "type": "button",
-                    "body": {
-                        "text": content
-                    },
-                    "action": {
-                        "buttons": button_objects
-                    }
-                }
-            }
-        else:
-            # Mensagem de texto simples
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual",
-                "to": to_number,
-                "type": "text",
-                "text": {
-                    "body": content
-                }
-            }
+        payload = build_message_payload(to_number, content, buttons)
         
         try:
-            response = requests.post(
-                url,
-                headers=headers,
-                data=json.dumps(payload)
-            )
+            response = get_whatsapp_client().post_message(url, self.token, payload)
             
             response_data = response.json()
             
@@ -98,7 +50,10 @@ class WhatsAppService:
             status = "sent" if response.status_code == 200 else "failed"
             error_message = None if response.status_code == 200 else str(response_data)
             
-            self._log_message(user_id, patient_id, message_type, content, buttons, status, error_message)
+            self._log_message(
+                user_id, patient_id, message_type, content, buttons, status, error_message,
+                wamid=message_id_from_response(response_data)
+            )
             
             return response_data
             
@@ -106,27 +61,20 @@ class WhatsAppService:
             self._log_message(user_id, patient_id, message_type, content, buttons, "failed", str(e))
             return {"error": str(e)}
     
-    def _log_message(self, user_id, patient_id, message_type, content, buttons, status, error=None):
-        """Registra log da mensagem no banco de dados"""
-        try:
-            message_log = MessageLog(
-                user_id=user_id,
-                patient_id=patient_id,
-                type=message_type,
-                payload_json={
-                    "content": content,
-                    "buttons": buttons if buttons else [],
-                    "error": error
-                },
-                status=status,
-                timestamp=datetime.utcnow()
-            )
-            
-            db.session.add(message_log)
-            db.session.commit()
-            
-        except Exception as e:
-            print(f"Erro ao registrar log de mensagem: {str(e)}")
+    def _log_message(self, user_id, patient_id, message_type, content, buttons, status, error=None, wamid=None):
+        """Registra log da mensagem no banco de dados (em lote, via message_log_writer)"""
+        message_log_writer.add(
+            user_id=user_id,
+            patient_id=patient_id,
+            message_type=message_type,
+            payload={
+                "content": content,
+                "buttons": buttons if buttons else [],
+                "error": error
+            },
+            status=status,
+            wamid=wamid
+        )
 
 # Instância global do serviço
 whatsapp_service = WhatsAppService()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import asyncio
+import json
+from collections import namedtuple
+import aiohttp
+from services.rate_limiter import get_rate_limiter, phone_number_id_from_url
+from services.whatsapp_client import CONNECT_TIMEOUT, READ_TIMEOUT, THROTTLE_RETRIES
+
+# Requisições simultâneas por envio em massa
+BULK_CONCURRENCY = int(os.getenv('WHATSAPP_BULK_CONCURRENCY', 32))
+
+# Resultado de cada mensagem, na mesma posição do payload de entrada
+SendResult = namedtuple('SendResult', ['ok', 'status', 'data', 'error'])
+
+
+async def _acquire(limiter):
+    # O script do limitador é síncrono; roda fora do event loop
+    loop = asyncio.get_running_loop()
+    wait = await loop.run_in_executor(None, limiter.try_acquire)
+    while wait > 0:
+        await asyncio.sleep(wait)
+        wait = await loop.run_in_executor(None, limiter.try_acquire)
+
+
+async def _post(session, url, payload, limiter=None):
+    data = json.dumps(payload)
+
+    try:
+        for attempt in range(THROTTLE_RETRIES + 1):
+            if limiter:
+                await _acquire(limiter)
+
+            async with session.post(url, data=data) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except (ValueError, aiohttp.ContentTypeError):
+                    body = None
+
+                if limiter:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, limiter.feedback, response.status, response.headers.get('Retry-After')
+                    )
+
+                if response.status != 429:
+                    break
+
+        ok = response.status == 200
+        return SendResult(ok, response.status, body, None if ok else str(body))
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return SendResult(False, None, None, str(e) or e.__class__.__name__)
+
+
+async def send_bulk_async(payloads, url, token, concurrency=BULK_CONCURRENCY, rate_limited=True):
+    """
+    Envia payloads já preparados mantendo até `concurrency` requisições em andamento
+
+    Os payloads são consumidos sob demanda por `concurrency` tarefas que
+    compartilham um pool de conexões keep-alive; um iterável grande não é
+    carregado inteiro antes do envio. Cada requisição aguarda o limitador de
+    taxa do número de origem e respostas 429 são reenviadas após a pausa.
+
+    Args:
+        payloads: Iterável de dicts para o endpoint /messages
+        url: Endpoint /messages da API
+        token: Token de acesso (Bearer)
+        concurrency: Máximo de requisições simultâneas
+        rate_limited: Se False, ignora o limitador de taxa
+
+    Returns:
+        list: SendResult na ordem dos payloads de entrada
+    """
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+    timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    limiter = get_rate_limiter(phone_number_id_from_url(url)) if rate_limited else None
+    source = enumerate(payloads)
+    results = {}
+
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector) as session:
+        async def worker():
+            # O iterador é compartilhado: cada tarefa pega o próximo payload livre
+            for index, payload in source:
+                results[index] = await _post(session, url, payload, limiter)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    return [results[index] for index in range(len(results))]
+
+
+def send_bulk(payloads, url=None, token=None, concurrency=BULK_CONCURRENCY, rate_limited=True):
+    """
+    Versão síncrona de send_bulk_async, para uso em jobs do RQ
+
+    Por padrão usa WHATSAPP_API_URL e WHATSAPP_TOKEN, como os demais jobs.
+    """
+    url = url or os.getenv('WHATSAPP_API_URL')
+    token = token or os.getenv('WHATSAPP_TOKEN')
+
+    if not url or not token:
+        raise ValueError('Configuração da API do WhatsApp incompleta')
+
+    return asyncio.run(send_bulk_async(payloads, url, token, concurrency, rate_limited))
@@ -0,0 +1,171 @@
+import os
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from services.rate_limiter import get_rate_limiter, phone_number_id_from_url
+
+# Configuração do pool de conexões com a WhatsApp Cloud API
+POOL_SIZE = int(os.getenv('WHATSAPP_HTTP_POOL_SIZE', 20))
+CONNECT_TIMEOUT = float(os.getenv('WHATSAPP_HTTP_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('WHATSAPP_HTTP_READ_TIMEOUT', 15))
+
+# Novas tentativas após um 429, respeitando a pausa do limitador
+THROTTLE_RETRIES = int(os.getenv('WHATSAPP_THROTTLE_RETRIES', 3))
+
+
+def button_reply_id(index, appointment_id=None):
+    """ID de um botão de resposta; inclui o agendamento a que a mensagem se refere, se houver"""
+    if appointment_id is None:
+        return f"btn_{index}"
+    return f"btn_{index}_appt_{appointment_id}"
+
+
+def appointment_id_from_reply(reply_id):
+    """Agendamento codificado no ID do botão respondido, ou None (mensagens antigas)"""
+    _, found, value = (reply_id or '').partition('_appt_')
+    return int(value) if found and value.isdigit() else None
+
+
+def build_message_payload(to_number, content, buttons=None, appointment_id=None):
+    """
+    Monta o corpo de uma mensagem de texto ou interativa (com botões)
+
+    Args:
+        to_number: Número do destinatário
+        content: Texto da mensagem
+        buttons: Lista de títulos de botões (opcional)
+        appointment_id: Agendamento a que os botões se referem (opcional)
+
+    Returns:
+        dict: Payload para o endpoint /messages
+    """
+    payload = {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": to_number,
+        "type": "interactive" if buttons else "text",
+    }
+
+    if buttons:
+        # Mensagem interativa com botões
+        button_objects = []
+        for i, button_text in enumerate(buttons):
+            button_objects.append({
+                "type": "reply",
+                "reply": {
+                    "id": button_reply_id(i, appointment_id),
+                    "title": button_text
+                }
+            })
+
+        payload["interactive"] = {
+            "type": "button",
+            "body": {
+                "text": content
+            },
+            "action": {
+                "buttons": button_objects
+            }
+        }
+    else:
+        # Mensagem de texto simples
+        payload["text"] = {
+            "body": content
+        }
+
+    return payload
+
+
+def message_id_from_response(data):
+    """Retorna o ID (wamid) da mensagem aceita pela API, ou None"""
+    try:
+        return data['messages'][0]['id']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class WhatsAppClient:
+    """
+    Cliente HTTP compartilhado para a WhatsApp Cloud API
+
+    Mantém uma requests.Session com pool de conexões keep-alive, de modo que
+    mensagens consecutivas reutilizam a mesma conexão TCP/TLS, e aplica
+    timeouts de conexão e leitura em todas as chamadas. Os envios passam pelo
+    limitador de taxa do número de origem (services.rate_limiter).
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 rate_limited=True):
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limited = rate_limited
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post_message(self, url, token, payload):
+        """
+        Envia um payload de mensagem
+
+        Aguarda um token do limitador antes de cada requisição; em caso de
+        429 o limitador reduz a taxa e pausa os envios, e a mensagem é
+        reenviada até THROTTLE_RETRIES vezes.
+
+        Args:
+            url: Endpoint /messages da API
+            token: Token de acesso (Bearer)
+            payload: Dict com o corpo da mensagem
+
+        Returns:
+            requests.Response
+        """
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+
+        data = json.dumps(payload)
+
+        if not self.rate_limited:
+            return self.session.post(url, headers=headers, data=data, timeout=self.timeout)
+
+        limiter = get_rate_limiter(phone_number_id_from_url(url))
+        for attempt in range(THROTTLE_RETRIES + 1):
+            limiter.acquire()
+            response = self.session.post(url, headers=headers, data=data, timeout=self.timeout)
+            limiter.feedback(response.status_code, response.headers.get('Retry-After'))
+
+            if response.status_code != 429:
+                break
+
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_whatsapp_client():
+    """
+    Retorna o cliente do processo atual
+
+    O cliente é criado no primeiro uso e recriado após um fork (o worker do
+    RQ executa cada job em um processo filho), para que conexões abertas
+    nunca sejam compartilhadas entre processos.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = WhatsAppClient()
+                _client_pid = pid
+
+    return _client
@@ -0,0 +1,52 @@
+"""Listagem de agendamentos: lista completa por padrão, paginação só quando pedida"""
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+from app import app
+from models import db, User, Patient, Appointment
+
+
+@pytest.fixture
+def token():
+    with app.app_context():
+        db.create_all()
+        user = User(name='Ana', email=f'list-{uuid.uuid4().hex}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        patient = Patient(user_id=user.id, name='Bia', whatsapp='5511955550000')
+        db.session.add(patient)
+        db.session.flush()
+        start = datetime(2030, 1, 7, 12)
+        db.session.add_all([
+            Appointment(user_id=user.id, patient_id=patient.id, start_datetime=start + timedelta(hours=i),
+                        end_datetime=start + timedelta(hours=i, minutes=50), mode='online', status='scheduled')
+            for i in range(250)
+        ])
+        db.session.commit()
+        return jwt.encode({'user_id': user.id, 'exp': datetime.utcnow() + timedelta(days=1)},
+                          app.config['JWT_SECRET_KEY'], algorithm='HS256')
+
+
+def get(token, query=''):
+    return app.test_client().get(f'/appointments{query}', headers={'Authorization': f'Bearer {token}'})
+
+
+def test_without_limit_or_cursor_returns_everything(token):
+    response = get(token)
+
+    assert response.status_code == 200
+    assert len(response.get_json()) == 250
+    assert 'X-Next-Cursor' not in response.headers
+
+
+def test_pagination_is_opt_in_and_follows_the_cursor(token):
+    first = get(token, '?limit=200')
+    assert len(first.get_json()) == 200
+
+    second = get(token, f"?limit=200&cursor={first.headers['X-Next-Cursor']}")
+    assert len(second.get_json()) == 50
+    assert 'X-Next-Cursor' not in second.headers
+    assert get(token, '?limit=0').status_code == 400
@@ -0,0 +1,31 @@
+"""Buffer de logs de mensagem: o flush não mexe na sessão de quem chama"""
+import uuid
+
+from app import app
+from models import db, User, Patient, MessageLog
+from services.message_log_writer import MessageLogWriter
+
+
+def test_flush_does_not_commit_the_callers_pending_session():
+    with app.app_context():
+        db.create_all()
+        key = uuid.uuid4().hex
+        user = User(name='Ana', email=f'logs-{key}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        patient = Patient(user_id=user.id, name='Bia', whatsapp='5511966660000')
+        db.session.add(patient)
+        db.session.commit()
+        user_id, patient_id = user.id, patient.id
+
+        writer = MessageLogWriter()
+        writer.add(user_id, patient_id, 'invite', {'content': 'Oi'}, 'sent')
+
+        # Rota que falhou deixando uma alteração pendente antes do teardown
+        db.session.get(Patient, patient_id).name = 'Alterado'
+        assert writer.flush() == 1
+        db.session.rollback()
+
+        db.session.expire_all()
+        assert db.session.get(Patient, patient_id).name == 'Bia'
+        assert MessageLog.query.filter_by(patient_id=patient_id).count() == 1
@@ -0,0 +1,108 @@
+"""Importação de pacientes por CSV: tudo ou nada, com o modo decidido pelos bytes lidos"""
+import io
+import uuid
+from datetime import datetime, timedelta
+
+import fakeredis
+import jwt
+import pytest
+from rq import Queue
+
+import workers
+from app import app
+from models import db, User, Patient
+from routes import patients as patients_routes
+from services import patient_import
+from services.patient_import import enqueue_import, get_import_status, run_import
+from worker_app import job_context
+
+
+@pytest.fixture
+def user():
+    with app.app_context():
+        db.create_all()
+        user = User(name='Ana', email=f'import-{uuid.uuid4().hex}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode(
+            {'user_id': user.id, 'exp': datetime.utcnow() + timedelta(days=1)},
+            app.config['JWT_SECRET_KEY'],
+            algorithm='HS256'
+        )
+        return user.id, token
+
+
+@pytest.fixture
+def redis_conn(monkeypatch):
+    connection = fakeredis.FakeRedis()
+    monkeypatch.setattr(workers, 'conn', connection)
+    monkeypatch.setattr(workers, 'default_queue', Queue('default', connection=connection))
+    return connection
+
+
+def csv_content(count, tail=b''):
+    # Bem mais que um bloco de leitura do TextIOWrapper, para o erro vir depois dos primeiros lotes
+    lines = ''.join(f'Paciente {i};5511{i:08d}\n' for i in range(count))
+    return lines.encode() + tail
+
+
+def patient_count(user_id):
+    with app.app_context():
+        return Patient.query.filter_by(user_id=user_id).count()
+
+
+def post_csv(token, content):
+    return app.test_client().post(
+        '/patients/import',
+        data={'file': (io.BytesIO(content), 'pacientes.csv')},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+
+
+def test_sync_import_with_bad_utf8_after_first_chunks_imports_nothing(user, monkeypatch):
+    user_id, token = user
+    monkeypatch.setattr(patient_import, 'CHUNK_SIZE', 10)
+
+    response = post_csv(token, csv_content(1000, 'Fim;5511\xe9\n'.encode('latin-1')))
+
+    assert response.status_code == 400
+    assert patient_count(user_id) == 0
+
+
+def test_sync_import_commits_all_rows(user):
+    user_id, token = user
+
+    response = post_csv(token, csv_content(30))
+
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 30
+    assert patient_count(user_id) == 30
+
+
+def test_mode_is_decided_by_bytes_read(user, redis_conn, monkeypatch):
+    user_id, token = user
+    content = csv_content(30)
+    monkeypatch.setattr(patients_routes, 'ASYNC_THRESHOLD_BYTES', 100)
+
+    response = post_csv(token, content)
+    assert response.status_code == 202
+    assert redis_conn.get(f"patient_import:{response.get_json()['import_id']}:file") == content
+
+    monkeypatch.setattr(patients_routes, 'MAX_FILE_BYTES', len(content) - 1)
+    assert post_csv(token, content).status_code == 413
+    assert patient_count(user_id) == 0
+
+
+def test_async_import_with_bad_utf8_imports_nothing(user, redis_conn, monkeypatch):
+    user_id, _ = user
+    monkeypatch.setattr(patient_import, 'CHUNK_SIZE', 10)
+    import_id = enqueue_import(user_id, csv_content(1000, b'Fim;5511\xff\n'))
+
+    with job_context():
+        assert run_import(import_id) is None
+
+    status = get_import_status(import_id)
+    assert status['status'] == 'failed' and status['imported'] == 0
+    assert status['processed'] > 0
+    assert patient_count(user_id) == 0
@@ -0,0 +1,32 @@
+"""Envio individual (e reenvio) de mensagens pelo job send_whatsapp_message"""
+import json
+
+import workers
+from models import db, User, Patient, MessageLog
+from worker_app import job_context
+
+
+def test_network_failure_with_retries_exhausted_is_logged(monkeypatch):
+    # Nada escuta nesta porta: ConnectionError em todas as tentativas
+    monkeypatch.setenv('WHATSAPP_API_URL', 'http://127.0.0.1:9/123/messages')
+    monkeypatch.setenv('WHATSAPP_TOKEN', 'teste')
+    monkeypatch.setattr(workers, 'schedule_retry', lambda *args, **kwargs: False)
+
+    with job_context():
+        db.create_all()
+        user = User(name='Ana', email='single-send@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        patient = Patient(user_id=user.id, name='Bia', whatsapp='5511977770000')
+        db.session.add(patient)
+        db.session.commit()
+        user_id, patient_id = user.id, patient.id
+
+    assert workers.send_whatsapp_message(user_id, patient_id, 'invite', 'Oi {Paciente}', attempt=5) is False
+    workers.flush_message_logs()
+
+    with job_context():
+        log = MessageLog.query.filter_by(user_id=user_id, patient_id=patient_id).one()
+
+    assert log.status == 'failed' and log.wamid is None
+    assert json.loads(log.payload_json)['content'] == 'Oi Bia'
@@ -0,0 +1,53 @@
+"""Invalidação do cache de slots em memória entre processos (versão no Redis)"""
+from datetime import date
+
+import fakeredis
+
+from services.slot_cache import SlotCache
+
+WEEK = date(2026, 10, 12)
+
+
+def make_caches(connection, count=2):
+    return [SlotCache(backend='memory', ttl=60, connection=connection) for _ in range(count)]
+
+
+def test_invalidation_reaches_other_processes():
+    api, worker = make_caches(fakeredis.FakeRedis())
+
+    api.set(1, WEEK, ['slot'])
+    assert api.get(1, WEEK) == ['slot']
+
+    worker.invalidate(1, [WEEK])
+
+    assert api.get(1, WEEK) is None
+    assert api.get(2, WEEK) is None
+
+
+def test_old_version_never_becomes_valid_again():
+    connection = fakeredis.FakeRedis()
+    api, worker = make_caches(connection)
+
+    worker.invalidate(1)
+    worker.invalidate(1)
+    api.set(1, WEEK, ['STALE'])
+
+    # A chave de versão some (expiração, eviction ou Redis reiniciado) e o
+    # profissional é invalidado de novo o mesmo número de vezes
+    connection.delete('slots:version:1')
+    worker.invalidate(1, [WEEK])
+    worker.invalidate(1, [WEEK])
+    assert api.get(1, WEEK) is None
+
+    connection.delete('slots:version:1')
+    assert api.get(1, WEEK) is None
+
+
+def test_without_redis_invalidation_is_local():
+    cache, = make_caches(fakeredis.FakeRedis(server=None, connected=False), count=1)
+
+    cache.set(1, WEEK, ['slot'])
+    assert cache.get(1, WEEK) == ['slot']
+
+    cache.invalidate(1, [WEEK])
+    assert cache.get(1, WEEK) is None
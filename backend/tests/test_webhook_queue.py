@@ -0,0 +1,143 @@
+"""Fila de webhooks do WhatsApp: nenhum evento se perde entre a resposta à Meta e o commit"""
+import json
+import uuid
+
+import fakeredis
+import pytest
+from rq import Queue
+
+import workers
+from models import db, User, Patient
+from services import webhook_processor
+from services.webhook_dedup import webhook_dedup
+from services.webhook_processor import (
+    WEBHOOK_QUEUE_KEY, WEBHOOK_PROCESSING_KEY, WEBHOOK_DEAD_LETTER_KEY, DRAIN_LOCK_KEY,
+    drain_webhook_queue, enqueue_webhook, pop_webhook_batch
+)
+from worker_app import job_context
+
+
+@pytest.fixture
+def redis_conn(monkeypatch):
+    connection = fakeredis.FakeRedis()
+    monkeypatch.setattr(workers, 'conn', connection)
+    monkeypatch.setattr(workers, 'high_queue', Queue('high', connection=connection))
+    monkeypatch.setattr(workers, 'retry_queue', Queue('retry', connection=connection))
+    monkeypatch.setattr(webhook_dedup, '_connection', connection)
+    monkeypatch.setattr(webhook_processor, '_after_status_change', lambda appointment: None)
+    return connection
+
+
+@pytest.fixture
+def patient():
+    with job_context():
+        db.create_all()
+        key = uuid.uuid4().int % 10 ** 9
+        user = User(name='Ana', email=f'webhook-{key}@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        patient = Patient(user_id=user.id, name='Bia', whatsapp=f'55{key}')
+        db.session.add(patient)
+        db.session.commit()
+        yield patient.id, patient.whatsapp
+
+
+def text_body(whatsapp, message_id, text='parar'):
+    message = {'from': whatsapp, 'id': message_id, 'type': 'text', 'text': {'body': text}}
+    return json.dumps({'entry': [{'changes': [{'value': {'messages': [message]}}]}]}).encode()
+
+
+def patient_status(patient_id):
+    with job_context():
+        db.session.expire_all()
+        return db.session.get(Patient, patient_id).status
+
+
+def test_drain_applies_and_clears_processing(redis_conn, patient):
+    patient_id, whatsapp = patient
+    enqueue_webhook(text_body(whatsapp, 'wamid.ok'))
+
+    with job_context():
+        assert drain_webhook_queue(redis_conn) == 1
+
+    assert patient_status(patient_id) == 'optout'
+    assert redis_conn.llen(WEBHOOK_QUEUE_KEY) == 0
+    assert redis_conn.llen(WEBHOOK_PROCESSING_KEY) == 0
+    assert not redis_conn.exists(DRAIN_LOCK_KEY)
+
+
+def test_failed_batch_is_requeued_and_retried_later(redis_conn, patient, monkeypatch):
+    patient_id, whatsapp = patient
+    body = text_body(whatsapp, 'wamid.outage')
+    enqueue_webhook(body)
+
+    def database_down(payloads):
+        raise RuntimeError('banco fora do ar')
+
+    monkeypatch.setattr(webhook_processor, 'process_payloads', database_down)
+    with job_context():
+        assert drain_webhook_queue(redis_conn) == 0
+
+    # O corpo volta para a fila, o dreno é reagendado e a marca continua
+    assert redis_conn.lrange(WEBHOOK_QUEUE_KEY, 0, -1) == [body]
+    assert redis_conn.llen(WEBHOOK_PROCESSING_KEY) == 0
+    assert workers.retry_queue.scheduled_job_registry.count == 1
+    assert redis_conn.exists(DRAIN_LOCK_KEY)
+
+    monkeypatch.undo()
+    monkeypatch.setattr(workers, 'conn', redis_conn)
+    monkeypatch.setattr(webhook_dedup, '_connection', redis_conn)
+    monkeypatch.setattr(webhook_processor, '_after_status_change', lambda appointment: None)
+    with job_context():
+        assert drain_webhook_queue(redis_conn) == 1
+
+    assert patient_status(patient_id) == 'optout'
+
+
+def test_body_goes_to_dead_letter_after_max_attempts(redis_conn, patient, monkeypatch):
+    _, whatsapp = patient
+    enqueue_webhook(text_body(whatsapp, 'wamid.poison'))
+    monkeypatch.setattr(webhook_processor, 'WEBHOOK_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(webhook_processor, 'process_payloads', lambda payloads: 1 / 0)
+
+    with job_context():
+        drain_webhook_queue(redis_conn)
+        drain_webhook_queue(redis_conn)
+
+    assert redis_conn.llen(WEBHOOK_QUEUE_KEY) == 0
+    entry = json.loads(redis_conn.lindex(WEBHOOK_DEAD_LETTER_KEY, 0))
+    assert entry['attempts'] == 2 and 'division by zero' in entry['error']
+
+
+def test_interrupted_batch_is_recovered_by_next_drain(redis_conn, patient):
+    patient_id, whatsapp = patient
+    enqueue_webhook(text_body(whatsapp, 'wamid.crash'))
+
+    # Worker morre depois de retirar o lote e antes do commit
+    assert len(pop_webhook_batch(redis_conn)) == 1
+    assert redis_conn.llen(WEBHOOK_QUEUE_KEY) == 0
+
+    with job_context():
+        assert drain_webhook_queue(redis_conn) == 1
+
+    assert patient_status(patient_id) == 'optout'
+    assert redis_conn.llen(WEBHOOK_PROCESSING_KEY) == 0
+
+
+def test_route_does_not_process_inline_when_only_the_job_enqueue_fails(redis_conn, patient, monkeypatch):
+    from app import app
+    import redis
+
+    patient_id, whatsapp = patient
+
+    def enqueue_fails(*args, **kwargs):
+        raise redis.exceptions.ConnectionError('fila indisponível')
+
+    monkeypatch.setattr(workers.high_queue, 'enqueue', enqueue_fails)
+    response = app.test_client().post('/webhooks/whatsapp', data=text_body(whatsapp, 'wamid.route'),
+                                      content_type='application/json')
+
+    assert response.status_code == 200
+    assert redis_conn.llen(WEBHOOK_QUEUE_KEY) == 1
+    assert not redis_conn.exists(DRAIN_LOCK_KEY)
+    assert patient_status(patient_id) == 'active'
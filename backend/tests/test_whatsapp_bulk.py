@@ -0,0 +1,90 @@
+"""Envio em massa contra a API simulada (scripts/fake_whatsapp_api.py)"""
+import json
+
+import pytest
+
+import workers
+from models import db, User, Patient, MessageLog
+from scripts.fake_whatsapp_api import start_fake_api
+from services.whatsapp_bulk import send_bulk
+from services.whatsapp_client import build_message_payload
+from worker_app import job_context
+
+
+@pytest.fixture
+def fake_api():
+    server, url = start_fake_api(latency_ms=5)
+    yield server, url
+    server.shutdown()
+
+
+def test_send_bulk_keeps_order_and_errors(fake_api):
+    server, url = fake_api
+    payloads = [build_message_payload(f'5511{i:04d}', f'Mensagem {i}') for i in range(60)]
+    payloads[7]['to'] = 'fail:400'
+    payloads[30]['to'] = 'fail:500'
+
+    results = send_bulk(iter(payloads), url=url, token='teste', concurrency=8, rate_limited=False)
+
+    assert len(results) == len(payloads)
+    assert (results[7].ok, results[7].status) == (False, 400)
+    assert (results[30].ok, results[30].status) == (False, 500)
+    for index, result in enumerate(results):
+        if index not in (7, 30):
+            assert result.ok and result.status == 200
+            assert result.data['contacts'][0]['input'] == payloads[index]['to']
+            assert result.data['messages'][0]['id'].startswith('wamid.')
+    assert server.requests == len(payloads)
+
+
+def test_send_bulk_reports_network_errors():
+    results = send_bulk([build_message_payload('5511', 'Oi')], url='http://127.0.0.1:9/messages', token='teste',
+                        rate_limited=False)
+
+    assert len(results) == 1
+    assert not results[0].ok and results[0].status is None and results[0].error
+
+
+def test_send_invite_batch_logs_wamid_and_retries_transient(fake_api, monkeypatch):
+    server, url = fake_api
+    monkeypatch.setenv('WHATSAPP_API_URL', url)
+    monkeypatch.setenv('WHATSAPP_TOKEN', 'teste')
+
+    retried = []
+    monkeypatch.setattr(workers, 'schedule_retry', lambda message, attempt, status_code=None, error=None:
+                        retried.append((message, attempt, status_code)) or True)
+    monkeypatch.setattr(workers, 'send_bulk', lambda *args, **kwargs: send_bulk(*args, rate_limited=False, **kwargs))
+
+    with job_context():
+        db.create_all()
+        user = User(name='Ana', email='bulk@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        numbers = ['551100', 'fail:503', 'fail:400', '551103', '551104']
+        patients = [Patient(user_id=user.id, name=f'P{i}', whatsapp=number) for i, number in enumerate(numbers)]
+        patients[4].status = 'optout'
+        db.session.add_all(patients)
+        db.session.commit()
+        user_id = user.id
+        patient_ids = [patient.id for patient in patients]
+
+    invites = [(patient_id, 100 + i) for i, patient_id in enumerate(patient_ids)]
+    content_json = json.dumps({'content': 'Oi {Paciente}, aqui é {Profissional}', 'buttons': ['Confirmar']})
+    sent = workers.send_invite_batch(user_id, invites, 1, content_json)
+    workers.flush_message_logs()
+
+    assert sent == 2
+    assert server.requests == 4  # o paciente com opt-out não é enviado
+
+    # 503 vai para a fila de reenvio, com o agendamento no botão
+    assert len(retried) == 1
+    message, attempt, status_code = retried[0]
+    assert (message['patient_id'], message['appointment_id'], attempt, status_code) == (patient_ids[1], 101, 1, 503)
+
+    with job_context():
+        logs = {log.patient_id: log for log in MessageLog.query.filter_by(user_id=user_id)}
+
+    assert set(logs) == {patient_ids[0], patient_ids[2], patient_ids[3]}
+    assert logs[patient_ids[0]].status == 'sent' and logs[patient_ids[0]].wamid.startswith('wamid.')
+    assert logs[patient_ids[2]].status == 'failed' and logs[patient_ids[2]].wamid is None
+    assert json.loads(logs[patient_ids[0]].payload_json)['content'] == 'Oi P0, aqui é Ana'
@@ -0,0 +1,69 @@
+import os
+import threading
+from contextlib import contextmanager
+from flask import Flask, has_app_context
+from dotenv import load_dotenv
+from models import db
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+_app = None
+_app_pid = None
+_app_lock = threading.Lock()
+
+
+def create_worker_app():
+    """
+    App Flask mínimo para workers e scheduler
+
+    Tem apenas a configuração do banco e o Flask-SQLAlchemy: sem blueprints,
+    CORS ou migrations e sem db.create_all() (o schema é responsabilidade
+    do `flask db upgrade`).
+    """
+    app = Flask('agendacerta-worker')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///psiagenda.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+
+    return app
+
+
+def get_worker_app():
+    """
+    Retorna o app do processo atual, criado uma única vez
+
+    O worker cria o app antes de começar a escutar as filas, então os
+    processos filhos dos jobs já o herdam prontos. Após um fork, as conexões
+    herdadas do pool são descartadas sem fechar (pertencem ao processo pai).
+    """
+    global _app, _app_pid
+
+    pid = os.getpid()
+    if _app is None or _app_pid != pid:
+        with _app_lock:
+            if _app is None:
+                _app = create_worker_app()
+            elif _app_pid != pid:
+                with _app.app_context():
+                    db.engine.dispose(close=False)
+            _app_pid = pid
+
+    return _app
+
+
+@contextmanager
+def job_context():
+    """
+    App context para a duração de um job
+
+    Se já houver um contexto ativo (job chamando outro job, ou envio dentro
+    de um lote), ele é reaproveitado junto com a sessão do banco.
+    """
+    if has_app_context():
+        yield
+        return
+
+    with get_worker_app().app_context():
+        yield
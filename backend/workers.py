@@ -1,12 +1,23 @@
 import os
+import atexit
 import redis
 from rq import Worker, Queue, Connection
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import pytz
+from sqlalchemy import and_, or_, case
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import requests
-import json
-from models import db, User, Patient, Appointment, AutomationSetting, MessageTemplate, MessageLog
+from services.whatsapp_client import get_whatsapp_client, build_message_payload, message_id_from_response
+from services.whatsapp_bulk import send_bulk, BULK_CONCURRENCY
+from services.send_retry import is_transient_failure, schedule_retry
+from services.message_log_writer import message_log_writer
+from services.templates import compile_text, get_compiled_template
+from services.webhook_processor import drain_webhook_queue
+from services.recipients import Recipient, load_recipient, load_recipients
+from worker_app import get_worker_app, job_context
+from models import db, User, Patient, Appointment, AutomationSetting, MessageTemplate, SentReminder
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -18,22 +29,39 @@ conn = redis.from_url(redis_url)
 # Filas de trabalho
 default_queue = Queue('default', connection=conn)
 high_queue = Queue('high', connection=conn)
+retry_queue = Queue('retry', connection=conn)  # Reenvios com backoff (enqueue_in)
+
+# Convites semanais: pacientes por job e requisições simultâneas por job
+INVITE_BATCH_SIZE = int(os.getenv('INVITE_BATCH_SIZE', 50))
+INVITE_BATCH_CONCURRENCY = int(os.getenv('INVITE_BATCH_CONCURRENCY', 8))
+
+# Janelas de envio dos lembretes, relativas ao início da sessão
+REMINDER_WINDOWS = {
+    'd1': (timedelta(hours=23), timedelta(hours=25)),
+    'h3': (timedelta(hours=2, minutes=45), timedelta(hours=3, minutes=15)),
+}
 
 # Funções de jobs
 
-def send_whatsapp_message(user_id, patient_id, message_type, content, buttons=None):
-    """Envia mensagem via WhatsApp API"""
-    from app import app
+def send_whatsapp_message(user_id, patient_id, message_type, content, buttons=None, attempt=1, values=None,
+                          appointment_id=None):
+    """
+    Envia uma mensagem via WhatsApp API; falhas transitórias são reenviadas pela fila 'retry'
     
-    with app.app_context():
-        user = User.query.get(user_id)
-        patient = Patient.query.get(patient_id)
+    O conteúdo é um template: {Profissional} e {Paciente} vêm do destinatário
+    (carregado com uma consulta) e os demais placeholders de `values` (ex.:
+    {'quando': 'Amanhã às 14:00'}). O `appointment_id` (convites e lembretes)
+    vai no ID dos botões para o webhook atualizar exatamente esse agendamento.
+    Lotes usam send_message_batch.
+    """
+    with job_context():
+        recipient = load_recipient(user_id, patient_id)
         
-        if not user or not patient:
+        if not recipient:
             return False
         
         # Verificar consentimento do paciente
-        if patient.status == 'optout':
+        if recipient.status == 'optout':
             return False
         
         # Preparar payload para API do WhatsApp
@@ -43,218 +71,540 @@ def send_whatsapp_message(user_id, patient_id, message_type, content, buttons=No
         if not whatsapp_api_url or not whatsapp_token:
             return False
         
-        # Formatar mensagem
-        formatted_content = content.replace('{Profissional}', user.name)
-        formatted_content = formatted_content.replace('{Paciente}', patient.name)
+        # Formatar mensagem (template compilado uma vez por processo)
+        formatted_content = compile_text(content).render(
+            dict(values or {}, Profissional=recipient.user_name, Paciente=recipient.name)
+        )
         
-        payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
-            "to": patient.whatsapp,
-            "type": "interactive" if buttons else "text",
-        }
+        payload = build_message_payload(recipient.whatsapp, formatted_content, buttons, appointment_id)
         
-        if buttons:
-            # Mensagem interativa com botões
-            button_objects = []
-            for i, button_text in enumerate(buttons):
-                button_objects.append({
-                    "type": "reply",
-                    "reply": {
-                        "id": f"btn_{i}",
-                        "title": button_text
-                    }
-                })
+        # Enviar mensagem (conexão reaproveitada do pool do processo)
+        wamid = None
+        try:
+            try:
+                response = get_whatsapp_client().post_message(whatsapp_api_url, whatsapp_token, payload)
+                status_code, error = response.status_code, None
+                if status_code == 200:
+                    try:
+                        wamid = message_id_from_response(response.json())
+                    except ValueError:
+                        pass
+            except requests.exceptions.RequestException as e:
+                status_code, error = None, e
             
-            payload["interactive"] = {
-                "type": "button",
-                "body": {
-                    "text": formatted_content
-                },
-                "action": {
-                    "buttons": button_objects
+            # Falha transitória: reenviar só esta mensagem, com backoff (o
+            # destinatário é recarregado no reenvio, para valer um opt-out recente)
+            if status_code != 200 and is_transient_failure(status_code, error):
+                message = {
+                    'user_id': user_id,
+                    'patient_id': patient_id,
+                    'message_type': message_type,
+                    'content': content,
+                    'buttons': buttons,
+                    'values': values,
+                    'appointment_id': appointment_id
                 }
-            }
-        else:
-            # Mensagem de texto simples
-            payload["text"] = {
-                "body": formatted_content
-            }
-        
-        # Enviar mensagem
-        headers = {
-            "Authorization": f"Bearer {whatsapp_token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            response = requests.post(
-                whatsapp_api_url,
-                headers=headers,
-                data=json.dumps(payload)
-            )
+                detail = str(error) if error else response.text[:500]
+                if schedule_retry(message, attempt, status_code, detail):
+                    return False
+            elif error:
+                raise error
             
-            # Registrar log da mensagem
-            message_log = MessageLog(
+            # Registrar log da mensagem (resultado final), gravado em lote
+            message_log_writer.add(
                 user_id=user_id,
                 patient_id=patient_id,
-                type=message_type,
-                payload_json={
+                message_type=message_type,
+                payload={
                     "content": formatted_content,
                     "buttons": buttons if buttons else []
                 },
-                status="sent" if response.status_code == 200 else "failed",
-                timestamp=datetime.utcnow()
+                status="sent" if status_code == 200 else "failed",
+                wamid=wamid
             )
             
-            db.session.add(message_log)
-            db.session.commit()
-            
-            return response.status_code == 200
+            return status_code == 200
             
         except Exception as e:
             print(f"Erro ao enviar mensagem: {str(e)}")
             return False
 
+def local_weekday_hour(timezone, now_utc):
+    """(dia da semana, hora) locais de um timezone no instante now_utc (naive, UTC)"""
+    now_local = pytz.utc.localize(now_utc).astimezone(pytz.timezone(timezone))
+    return now_local.weekday(), now_local.hour
+
+def select_due_weekly_invites(now_utc):
+    """
+    Seleciona os profissionais cujo convite semanal é devido em now_utc
+    
+    O dia e a hora locais são calculados uma vez por timezone distinto; os
+    timezones com o mesmo (dia, hora) local viram um único filtro sobre
+    (timezone, weekly_invite_dow, weekly_invite_hour). O custo depende do
+    número de timezones e não do número de usuários.
+    
+    Returns:
+        list: Usuários com convite devido (modos A e B)
+    """
+    enabled = or_(AutomationSetting.mode.is_(None), AutomationSetting.mode != 'C')
+    
+    timezones = [
+        timezone for (timezone,) in db.session.query(User.timezone).join(
+            AutomationSetting, AutomationSetting.user_id == User.id
+        ).filter(enabled).distinct()
+    ]
+    
+    # (dia, hora) local -> timezones
+    buckets = {}
+    for timezone in timezones:
+        try:
+            buckets.setdefault(local_weekday_hour(timezone, now_utc), []).append(timezone)
+        except pytz.exceptions.UnknownTimeZoneError:
+            print(f"Timezone inválido ignorado nos convites semanais: {timezone}")
+    
+    if not buckets:
+        return []
+    
+    return User.query.join(
+        AutomationSetting, AutomationSetting.user_id == User.id
+    ).filter(
+        enabled,
+        or_(*[
+            and_(
+                User.timezone.in_(bucket),
+                AutomationSetting.weekly_invite_dow == weekday,
+                AutomationSetting.weekly_invite_hour == hour
+            )
+            for (weekday, hour), bucket in buckets.items()
+        ])
+    ).order_by(User.id).all()
+
 def process_weekly_invites():
-    """Processa convites semanais para confirmação de sessões"""
-    from app import app
+    """Processa convites semanais; retorna a quantidade de lotes enfileirados"""
+    with job_context():
+        batches = 0
+        
+        for user in select_due_weekly_invites(datetime.utcnow()):
+            batches += send_user_weekly_invites(user)
+        
+        return batches
+
+def select_weekly_invites(user, now_utc):
+    """
+    Pacientes ativos com sessão ainda não confirmada na semana local do profissional
+    
+    Uma única consulta junta agendamentos 'scheduled' entre agora e o fim da
+    semana (segunda a domingo, no timezone do profissional) com os pacientes
+    ativos. Cada paciente entra uma vez, com a sua próxima sessão.
+    
+    Returns:
+        list: Pares (patient_id, appointment_id)
+    """
+    user_timezone = pytz.timezone(user.timezone)
+    now_local = pytz.utc.localize(now_utc).astimezone(user_timezone)
+    week_end_local = user_timezone.localize(
+        datetime.combine(now_local.date() + timedelta(days=7 - now_local.weekday()), datetime.min.time())
+    )
+    week_end_utc = week_end_local.astimezone(pytz.utc).replace(tzinfo=None)
+    
+    invites = {}
+    for patient_id, appointment_id in db.session.query(
+        Appointment.patient_id, Appointment.id
+    ).join(
+        Patient, Patient.id == Appointment.patient_id
+    ).filter(
+        Appointment.user_id == user.id,
+        Appointment.status == 'scheduled',
+        Appointment.start_datetime >= now_utc,
+        Appointment.start_datetime < week_end_utc,
+        Patient.status == 'active'
+    ).order_by(Appointment.patient_id, Appointment.start_datetime):
+        invites.setdefault(patient_id, appointment_id)
+    
+    return list(invites.items())
+
+def send_user_weekly_invites(user):
+    """
+    Enfileira o convite semanal aos pacientes com sessão a confirmar na semana
+    
+    Os convites são divididos em lotes de INVITE_BATCH_SIZE, cada um
+    enviado por um job send_invite_batch na fila default.
+    
+    Returns:
+        int: Quantidade de lotes enfileirados
+    """
+    # Obter template de convite
+    invite_template = MessageTemplate.query.filter_by(
+        user_id=user.id,
+        type='invite'
+    ).first()
+    
+    if not invite_template:
+        return 0
+    
+    # Pacientes ativos com sessão 'scheduled' nesta semana, com o agendamento
+    invites = select_weekly_invites(user, datetime.utcnow())
+    
+    batches = 0
+    for i in range(0, len(invites), INVITE_BATCH_SIZE):
+        default_queue.enqueue(
+            send_invite_batch, user.id, invites[i:i + INVITE_BATCH_SIZE],
+            invite_template.id, invite_template.content_json
+        )
+        batches += 1
+    
+    return batches
+
+def send_invite_batch(user_id, invites, template_id, content_json):
+    """
+    Envia um lote de convites pelo envio em massa (INVITE_BATCH_CONCURRENCY em voo)
+    
+    `invites` são pares (patient_id, appointment_id) de select_weekly_invites;
+    o template (id e content_json salvo) é compilado uma vez e renderizado
+    para o lote inteiro com render_batch.
+    """
+    template = get_compiled_template(template_id, content_json)
+    
+    with job_context():
+        recipients = load_recipients(user_id, [patient_id for patient_id, _ in invites])
+    
+    invites = [
+        (recipients[patient_id], appointment_id) for patient_id, appointment_id in invites
+        if patient_id in recipients
+    ]
+    texts = template.render_batch(
+        {'Profissional': recipient.user_name, 'Paciente': recipient.name} for recipient, _ in invites
+    )
+    
+    return send_message_batch(user_id, [
+        {
+            'patient_id': recipient.patient_id,
+            'message_type': 'invite',
+            'content': template.content,
+            'buttons': template.buttons,
+            'appointment_id': appointment_id,
+            'recipient': recipient,
+            'text': text
+        }
+        for (recipient, appointment_id), text in zip(invites, texts)
+    ], concurrency=INVITE_BATCH_CONCURRENCY)
+
+def send_message_batch(user_id, messages, concurrency=BULK_CONCURRENCY):
+    """
+    Envia um lote de mensagens de um profissional com services.whatsapp_bulk
+    
+    Cada mensagem é um dict com patient_id, message_type, recipient
+    (Recipient), text (já renderizado), content (template, para reenvio),
+    buttons e, opcionalmente, values e appointment_id; o envio não lê o
+    banco. Os resultados vão para o MessageLog com o wamid e as falhas
+    transitórias são reenviadas pela fila 'retry', como em
+    send_whatsapp_message.
     
-    with app.app_context():
-        # Obter todos os usuários com automação ativa
-        users = User.query.all()
+    Returns:
+        int: Quantidade de mensagens aceitas pela API
+    """
+    whatsapp_api_url = os.getenv('WHATSAPP_API_URL')
+    whatsapp_token = os.getenv('WHATSAPP_TOKEN')
+    
+    # Verificar consentimento dos pacientes
+    outgoing = [message for message in messages if message['recipient'].status != 'optout']
+    
+    if not outgoing or not whatsapp_api_url or not whatsapp_token:
+        return 0
+    
+    with job_context():
+        results = send_bulk(
+            (
+                build_message_payload(
+                    message['recipient'].whatsapp, message['text'], message['buttons'], message.get('appointment_id')
+                )
+                for message in outgoing
+            ),
+            whatsapp_api_url,
+            whatsapp_token,
+            concurrency=concurrency
+        )
         
-        for user in users:
-            # Verificar configurações de automação
-            settings = AutomationSetting.query.filter_by(user_id=user.id).first()
-            
-            if not settings or settings.mode == 'C':  # Modo C: apenas lembretes
-                continue
-            
-            # Verificar se é o dia e hora configurados para envio
-            user_timezone = pytz.timezone(user.timezone)
-            now_user_tz = datetime.now(user_timezone)
-            
-            if now_user_tz.weekday() != settings.weekly_invite_dow or now_user_tz.hour != settings.weekly_invite_hour:
-                continue
-            
-            # Obter template de convite
-            invite_template = MessageTemplate.query.filter_by(
-                user_id=user.id,
-                type='invite'
-            ).first()
-            
-            if not invite_template:
-                continue
-            
-            # Obter pacientes ativos
-            patients = Patient.query.filter_by(
-                user_id=user.id,
-                status='active'
-            ).all()
+        sent = 0
+        for message, result in zip(outgoing, results):
+            # Falha transitória (429, 5xx ou rede): reenviar só esta mensagem
+            if not result.ok and (result.status is None or is_transient_failure(result.status)):
+                retry = {
+                    'user_id': user_id,
+                    'patient_id': message['patient_id'],
+                    'message_type': message['message_type'],
+                    'content': message['content'],
+                    'buttons': message['buttons'],
+                    'values': message.get('values'),
+                    'appointment_id': message.get('appointment_id')
+                }
+                if schedule_retry(retry, 1, result.status, result.error):
+                    continue
             
-            for patient in patients:
-                # Enviar convite
-                send_whatsapp_message(
-                    user_id=user.id,
-                    patient_id=patient.id,
-                    message_type='invite',
-                    content=invite_template.content_json.get('content', ''),
-                    buttons=invite_template.content_json.get('buttons', [])
+            message_log_writer.add(
+                user_id=user_id,
+                patient_id=message['patient_id'],
+                message_type=message['message_type'],
+                payload={
+                    "content": message['text'],
+                    "buttons": message['buttons'] if message['buttons'] else []
+                },
+                status="sent" if result.ok else "failed",
+                wamid=message_id_from_response(result.data) if result.ok else None
+            )
+            sent += result.ok
+        
+        return sent
+
+def send_weekly_invite(user_id):
+    """Envia o convite semanal agendado pelo scheduler e agenda o da próxima semana"""
+    from scheduler import schedule_weekly_invite
+    
+    with job_context():
+        user = User.query.get(user_id)
+        settings = AutomationSetting.query.filter_by(user_id=user_id).first()
+        
+        if not user or not settings or settings.mode == 'C':
+            return 0
+        
+        # Conferir dia e hora locais (a configuração pode ter mudado desde o agendamento)
+        batches = 0
+        if local_weekday_hour(user.timezone, datetime.utcnow()) == (settings.weekly_invite_dow, settings.weekly_invite_hour):
+            batches = send_user_weekly_invites(user)
+        
+        schedule_weekly_invite(settings, user.timezone)
+        
+        return batches
+
+def select_due_reminders(now_utc, appointment_id=None):
+    """
+    Seleciona, para todos os profissionais, os lembretes D-1 e H-3 devidos
+    
+    Uma única consulta junta agendamentos confirmados nas janelas de envio
+    com as configurações de automação, o template de lembrete e o timezone
+    do profissional, então o custo depende dos lembretes devidos e não do
+    número de usuários. Lembretes já registrados em sent_reminders são
+    excluídos por anti-join.
+    
+    Args:
+        now_utc: Datetime UTC de referência
+        appointment_id: Restringir a um agendamento (jobs do scheduler)
+    
+    Returns:
+        list: Linhas com appointment_id, user_id, patient_id, start_datetime,
+              dados do destinatário (patient_name, whatsapp, patient_status,
+              user_name), timezone, kind ('d1' ou 'h3') e content_json do template
+    """
+    d1_start, d1_end = (now_utc + delta for delta in REMINDER_WINDOWS['d1'])
+    h3_start, h3_end = (now_utc + delta for delta in REMINDER_WINDOWS['h3'])
+    
+    in_d1 = and_(
+        AutomationSetting.enable_d1.is_(True),
+        Appointment.start_datetime >= d1_start,
+        Appointment.start_datetime <= d1_end
+    )
+    in_h3 = and_(
+        AutomationSetting.enable_h3.is_(True),
+        Appointment.start_datetime >= h3_start,
+        Appointment.start_datetime <= h3_end
+    )
+    
+    kind = case((in_d1, 'd1'), else_='h3')
+    
+    query = db.session.query(
+        Appointment.id.label('appointment_id'),
+        Appointment.user_id,
+        Appointment.patient_id,
+        Appointment.start_datetime,
+        Patient.name.label('patient_name'),
+        Patient.whatsapp,
+        Patient.status.label('patient_status'),
+        User.name.label('user_name'),
+        User.timezone,
+        MessageTemplate.id.label('template_id'),
+        MessageTemplate.content_json,
+        kind.label('kind')
+    ).join(
+        User, User.id == Appointment.user_id
+    ).join(
+        Patient, Patient.id == Appointment.patient_id
+    ).join(
+        AutomationSetting, AutomationSetting.user_id == Appointment.user_id
+    ).join(
+        MessageTemplate, and_(
+            MessageTemplate.user_id == Appointment.user_id,
+            MessageTemplate.type == 'reminder'
+        )
+    ).outerjoin(
+        SentReminder, and_(
+            SentReminder.appointment_id == Appointment.id,
+            SentReminder.kind == kind
+        )
+    ).filter(
+        Appointment.status == 'confirmed',
+        or_(in_d1, in_h3),
+        SentReminder.id.is_(None)
+    )
+    
+    if appointment_id is not None:
+        query = query.filter(Appointment.id == appointment_id)
+    
+    rows = query.order_by(Appointment.user_id, Appointment.start_datetime).all()
+    
+    # Um lembrete por agendamento e tipo, mesmo com templates duplicados
+    due = {}
+    for row in rows:
+        due.setdefault((row.appointment_id, row.kind), row)
+    
+    return list(due.values())
+
+def claim_reminders(due_reminders):
+    """
+    Registra os lembretes em sent_reminders antes do envio
+    
+    A restrição única (appointment_id, kind) garante que, se dois ticks
+    selecionarem o mesmo lembrete, apenas um deles o registre e envie.
+    
+    Returns:
+        set: Pares (appointment_id, kind) registrados por esta chamada
+    """
+    if not due_reminders:
+        return set()
+    
+    dialect = db.session.get_bind().dialect.name
+    insert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+    
+    now = datetime.utcnow()
+    statement = insert(SentReminder).values([
+        {'appointment_id': row.appointment_id, 'kind': row.kind, 'sent_at': now}
+        for row in due_reminders
+    ]).on_conflict_do_nothing(
+        index_elements=['appointment_id', 'kind']
+    ).returning(SentReminder.appointment_id, SentReminder.kind)
+    
+    claimed = {(appointment_id, kind) for appointment_id, kind in db.session.execute(statement)}
+    db.session.commit()
+    
+    return claimed
+
+def build_reminder_batches(due_reminders):
+    """
+    Formata os lembretes devidos e agrupa por profissional
+    
+    Os textos são renderizados com render_batch, uma chamada por template.
+    
+    Returns:
+        dict: user_id -> lista de mensagens para send_reminder_batch
+    """
+    by_template = {}
+    for row in due_reminders:
+        by_template.setdefault((row.template_id, row.content_json), []).append(row)
+    
+    by_user = {}
+    
+    for (template_id, content_json), rows in by_template.items():
+        template = get_compiled_template(template_id, content_json)
+        
+        # Valor do {quando}, no timezone do profissional
+        values_list = []
+        for row in rows:
+            start_local = pytz.utc.localize(row.start_datetime).astimezone(pytz.timezone(row.timezone))
+            when = 'Amanhã' if row.kind == 'd1' else 'Hoje'
+            values_list.append({'quando': f"{when} às {start_local.strftime('%H:%M')}"})
+        
+        texts = template.render_batch(
+            dict(values, Profissional=row.user_name, Paciente=row.patient_name)
+            for row, values in zip(rows, values_list)
+        )
+        
+        for row, values, text in zip(rows, values_list, texts):
+            by_user.setdefault(row.user_id, []).append({
+                'patient_id': row.patient_id,
+                'appointment_id': row.appointment_id,
+                'message_type': f'reminder_{row.kind}',
+                'content': template.content,
+                'buttons': template.buttons,
+                'values': values,
+                'text': text,
+                'recipient': Recipient(
+                    row.patient_id, row.patient_name, row.whatsapp, row.patient_status,
+                    row.user_id, row.user_name, row.timezone
                 )
+            })
+    
+    return by_user
 
 def process_appointment_reminders():
-    """Processa lembretes de consultas (D-1 e H-3)"""
-    from app import app
-    
-    with app.app_context():
-        # Obter todos os usuários
-        users = User.query.all()
+    """Processa lembretes de consultas (D-1 e H-3); pode rodar a cada minuto"""
+    with job_context():
+        due_reminders = select_due_reminders(datetime.utcnow())
+        claimed = claim_reminders(due_reminders)
+        due_reminders = [row for row in due_reminders if (row.appointment_id, row.kind) in claimed]
         
-        for user in users:
-            # Verificar configurações de automação
-            settings = AutomationSetting.query.filter_by(user_id=user.id).first()
-            
-            if not settings:
-                continue
-            
-            # Obter template de lembrete
-            reminder_template = MessageTemplate.query.filter_by(
-                user_id=user.id,
-                type='reminder'
-            ).first()
-            
-            if not reminder_template:
-                continue
-            
-            # Obter timezone do usuário
-            user_timezone = pytz.timezone(user.timezone)
-            now_utc = datetime.utcnow()
-            
-            # Processar lembretes D-1 (24h antes)
-            if settings.enable_d1:
-                # Calcular intervalo para D-1
-                d1_start = now_utc + timedelta(hours=23)
-                d1_end = now_utc + timedelta(hours=25)
-                
-                # Buscar agendamentos confirmados neste intervalo
-                d1_appointments = Appointment.query.filter_by(
-                    user_id=user.id,
-                    status='confirmed'
-                ).filter(
-                    Appointment.start_datetime >= d1_start,
-                    Appointment.start_datetime <= d1_end
-                ).all()
-                
-                for appt in d1_appointments:
-                    # Formatar mensagem
-                    start_local = pytz.utc.localize(appt.start_datetime).astimezone(user_timezone)
-                    
-                    content = reminder_template.content_json.get('content', '')
-                    content = content.replace('{quando}', f"Amanhã às {start_local.strftime('%H:%M')}")
-                    
-                    # Enviar lembrete
-                    send_whatsapp_message(
-                        user_id=user.id,
-                        patient_id=appt.patient_id,
-                        message_type='reminder_d1',
-                        content=content,
-                        buttons=reminder_template.content_json.get('buttons', [])
-                    )
-            
-            # Processar lembretes H-3 (3h antes)
-            if settings.enable_h3:
-                # Calcular intervalo para H-3
-                h3_start = now_utc + timedelta(hours=2, minutes=45)
-                h3_end = now_utc + timedelta(hours=3, minutes=15)
-                
-                # Buscar agendamentos confirmados neste intervalo
-                h3_appointments = Appointment.query.filter_by(
-                    user_id=user.id,
-                    status='confirmed'
-                ).filter(
-                    Appointment.start_datetime >= h3_start,
-                    Appointment.start_datetime <= h3_end
-                ).all()
-                
-                for appt in h3_appointments:
-                    # Formatar mensagem
-                    start_local = pytz.utc.localize(appt.start_datetime).astimezone(user_timezone)
-                    
-                    content = reminder_template.content_json.get('content', '')
-                    content = content.replace('{quando}', f"Hoje às {start_local.strftime('%H:%M')}")
-                    
-                    # Enviar lembrete
-                    send_whatsapp_message(
-                        user_id=user.id,
-                        patient_id=appt.patient_id,
-                        message_type='reminder_h3',
-                        content=content,
-                        buttons=reminder_template.content_json.get('buttons', [])
-                    )
+        # Agrupar por profissional e enfileirar um job de envio por grupo
+        for user_id, reminders in build_reminder_batches(due_reminders).items():
+            high_queue.enqueue(send_reminder_batch, user_id, reminders)
+        
+        return len(due_reminders)
+
+def send_appointment_reminder(appointment_id, kind):
+    """Envia um lembrete agendado pelo scheduler, se ainda estiver devido"""
+    with job_context():
+        due_reminders = [
+            row for row in select_due_reminders(datetime.utcnow(), appointment_id=appointment_id)
+            if row.kind == kind
+        ]
+        claimed = claim_reminders(due_reminders)
+        due_reminders = [row for row in due_reminders if (row.appointment_id, row.kind) in claimed]
+        
+        for user_id, reminders in build_reminder_batches(due_reminders).items():
+            send_reminder_batch(user_id, reminders)
+        
+        return len(due_reminders)
+
+def send_reminder_batch(user_id, reminders):
+    """Envia os lembretes devidos de um profissional; retorna quantos foram aceitos"""
+    return send_message_batch(user_id, reminders)
+
+def process_webhook_events():
+    """Drena em lotes a fila de webhooks do WhatsApp gravada por /webhooks/whatsapp"""
+    with job_context():
+        return drain_webhook_queue(conn)
+
+def import_patients_job(import_id):
+    """Importa em background um CSV de pacientes enviado para /patients/import"""
+    from services.patient_import import run_import
+    
+    with job_context():
+        return run_import(import_id)
+
+def flush_message_logs():
+    """Grava os logs de mensagem ainda no buffer do processo"""
+    if not message_log_writer.pending():
+        return 0
+    
+    with job_context():
+        return message_log_writer.flush()
+
+# Encerramento do processo (worker sem fork ou chamadas diretas aos jobs)
+atexit.register(flush_message_logs)
+
+class AgendaWorker(Worker):
+    """Worker do RQ que grava os logs pendentes ao fim de cada job"""
+    
+    def perform_job(self, job, queue):
+        # Roda no processo filho, que termina com os._exit (sem atexit)
+        try:
+            return super().perform_job(job, queue)
+        finally:
+            flush_message_logs()
 
 # Inicialização do worker
 if __name__ == '__main__':
+    # App criado uma vez no processo principal; os jobs (processos filhos) o herdam
+    get_worker_app()
+    
     with Connection(conn):
-        worker = Worker(['default', 'high'])
-        worker.work()
\ No newline at end of file
+        worker = AgendaWorker(['default', 'high', 'retry'])
+        # O scheduler embutido do RQ move os reenvios agendados para a fila
+        worker.work(with_scheduler=True)
\ No newline at end of file